@@ -0,0 +1,117 @@
+"""
+Computes a player's moves in the background, so that the pygame window keeps responding while the computer thinks.
+
+Work is run in daemon threads, which never keep the program alive after the user quits. A game loop asks for a move
+with AsyncPlayer.request_move and polls the returned future once per frame, instead of calling make_move and blocking.
+"""
+from __future__ import annotations
+from manager import *
+from concurrent.futures import Future
+from typing import Any, Callable
+import threading
+
+
+def run_in_background(function: Callable[..., Any], *args) -> Future:
+    """
+    Calls function with the given arguments in a new daemon thread, and returns a future of its result.
+    """
+    future = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = function(*args)
+        except BaseException as error:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+class AsyncPlayer(Player):
+    """
+    A player that computes the moves of another player in a background thread.
+
+    If the wrapped player has a ponder method, it can also think during the opponent's turn: start_pondering runs
+    player.ponder(move_sequence, stop) in the background, where stop is a threading.Event that is set when the
+    opponent's move arrives, and the player should return soon after it is set.
+
+    While a move is being computed, the game must not be changed by anyone else.
+
+    Instance Attributes:
+        - colour: the colour of the pieces this player uses.
+        - player: the player whose moves are computed
+    """
+    colour: str
+    player: Player
+    _future: Optional[Future]
+    _ponder_future: Optional[Future]
+    _stop_pondering: threading.Event
+
+    def __init__(self, player: Player):
+        Player.__init__(self, player.colour)
+        self.player = player
+        self._future = None
+        self._ponder_future = None
+        self._stop_pondering = threading.Event()
+
+    def request_move(self, available_columns: list[str], game: GameManager) -> Future:
+        """
+        Starts computing a move, and returns a future that will hold the chosen column.
+
+        Any pondering is stopped first.
+        """
+        ponder_future = self._ponder_future
+        self.stop_pondering()
+        self._future = run_in_background(self._compute_move, ponder_future, list(available_columns), game)
+        return self._future
+
+    def _compute_move(self, ponder_future: Optional[Future], available_columns: list[str], game: GameManager) -> str:
+        """
+        Waits for the previous pondering to finish, then calls the wrapped player's make_move.
+        """
+        if ponder_future is not None:
+            try:
+                ponder_future.result()
+            except Exception:
+                pass  # a failed ponder only loses the work it did, the move can still be computed
+        return self.player.make_move(available_columns, game)
+
+    def make_move(self, available_columns: list[str], game: GameManager) -> str:
+        """
+        Computes a move in the background and waits for it, so that an AsyncPlayer can be used like any other player.
+        """
+        return self.request_move(available_columns, game).result()
+
+    def start_pondering(self, game: GameManager) -> None:
+        """
+        Lets the wrapped player think about the position after the current moves of game while the opponent moves.
+
+        Does nothing if the wrapped player cannot ponder.
+        """
+        ponder = getattr(self.player, 'ponder', None)
+        if ponder is None:
+            return
+        self.stop_pondering()
+        self._stop_pondering = threading.Event()
+        self._ponder_future = run_in_background(ponder, list(game.move_sequence), self._stop_pondering)
+
+    def stop_pondering(self) -> None:
+        """
+        Tells the wrapped player to stop pondering, without waiting for it to stop.
+        """
+        self._stop_pondering.set()
+        self._ponder_future = None
+
+    def cancel(self) -> None:
+        """
+        Stops pondering and abandons the move being computed, if any. A move that has already started is still
+        computed in its thread, but nothing waits for it.
+        """
+        self.stop_pondering()
+        if self._future is not None:
+            self._future.cancel()
+            self._future = None
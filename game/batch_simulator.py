@@ -0,0 +1,178 @@
+"""
+Simulates many Connect 4 games at once.
+
+Every game in a batch is advanced in lock-step, one ply at a time, with the boards stored as NumPy arrays of packed
+bitboards (using the same bit layout as connect4.BitBoard). This avoids the per-game Python overhead of GameManager
+and is used to generate large random datasets quickly.
+"""
+from __future__ import annotations
+from typing import Callable, Optional
+from connect4 import COLUMNS, BIT_COLUMN_HEIGHT
+from game_records import GameRecordWriter
+import numpy as np
+
+# a policy is given the batch, the legal move mask of the active games and a random generator, and returns the
+# index of the column to play for every active game
+Policy = Callable[['GameBatch', np.ndarray, np.random.Generator], np.ndarray]
+
+_SHIFTS = [np.uint64(shift) for shift in (1, BIT_COLUMN_HEIGHT - 1, BIT_COLUMN_HEIGHT, BIT_COLUMN_HEIGHT + 1)]
+_ONE = np.uint64(1)
+
+
+def has_alignment(bits: np.ndarray) -> np.ndarray:
+    """
+    Returns, for each bitboard in bits, whether it contains four pieces in a row in any direction.
+    """
+    result = np.zeros(bits.shape, dtype=bool)
+    for shift in _SHIFTS:
+        pairs = bits & (bits >> shift)
+        result |= (pairs & (pairs >> (shift + shift))) != 0
+    return result
+
+
+class GameBatch:
+    """
+    A batch of Connect 4 games that are played simultaneously.
+
+    Instance Attributes:
+        - pieces: the bitboards of the red (index 0) and yellow (index 1) pieces of every game, shape (2, N)
+        - heights: the number of pieces in each column of every game, shape (N, 7)
+        - moves: the column index played on each turn of every game, -1 after the game has ended, shape (N, 42)
+        - num_moves: the number of moves played in every game
+        - winners: 1 for a red win, 2 for a yellow win, 0 for a draw or a game still in progress
+        - active: whether each game is still in progress
+    """
+    pieces: np.ndarray
+    heights: np.ndarray
+    moves: np.ndarray
+    num_moves: np.ndarray
+    winners: np.ndarray
+    active: np.ndarray
+
+    def __init__(self, num_games: int):
+        self.pieces = np.zeros((2, num_games), dtype=np.uint64)
+        self.heights = np.zeros((num_games, 7), dtype=np.int8)
+        self.moves = np.full((num_games, 42), -1, dtype=np.int8)
+        self.num_moves = np.zeros(num_games, dtype=np.int8)
+        self.winners = np.zeros(num_games, dtype=np.int8)
+        self.active = np.ones(num_games, dtype=bool)
+
+    def legal_moves(self) -> np.ndarray:
+        """
+        Returns a boolean mask of shape (N, 7) of the columns that can still be played in every game.
+        """
+        return self.heights < 6
+
+    def play(self, ply: int, columns: np.ndarray) -> None:
+        """
+        Drops a piece into the given column of every active game, and marks games that have been won as finished.
+
+        columns has one entry per active game. Preconditions:
+            - every column is legal in its game
+            - ply is the number of moves already played in every active game
+        """
+        games = np.flatnonzero(self.active)
+        rows = self.heights[games, columns]
+        bits = _ONE << (columns.astype(np.uint64) * np.uint64(BIT_COLUMN_HEIGHT) + rows.astype(np.uint64))
+        colour = ply % 2
+
+        self.pieces[colour, games] |= bits
+        self.heights[games, columns] = rows + 1
+        self.moves[games, ply] = columns
+        self.num_moves[games] = ply + 1
+
+        won = has_alignment(self.pieces[colour, games])
+        self.winners[games[won]] = colour + 1
+        self.active[games[won]] = False
+        if ply == 41:
+            self.active[:] = False
+
+    def run(self, red_policy: Policy, yellow_policy: Policy, rng: np.random.Generator) -> None:
+        """
+        Plays every game in this batch to the end.
+        """
+        for ply in range(42):
+            if not self.active.any():
+                return
+            legal = self.legal_moves()[self.active]
+            if ply % 2 == 0:
+                columns = red_policy(self, legal, rng)
+            else:
+                columns = yellow_policy(self, legal, rng)
+            self.play(ply, columns)
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the number of games won by each colour, in the same format as manager.run_games_random.
+        """
+        counts = np.bincount(self.winners, minlength=3)
+        return {'red': int(counts[1]), 'yellow': int(counts[2]), 'draw': int(counts[0])}
+
+    def move_sequence(self, game: int) -> list[str]:
+        """
+        Returns the moves of the given game as column letters, like GameManager.move_sequence.
+        """
+        return [COLUMNS[column] for column in self.moves[game, :self.num_moves[game]]]
+
+    def winner(self, game: int) -> str:
+        """
+        Returns the winner of the given game, like GameManager.winner.
+        """
+        return ('draw', 'red', 'yellow')[self.winners[game]]
+
+
+def random_policy(batch: GameBatch, legal: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    Chooses a legal column uniformly at random for every active game.
+    """
+    return np.argmax(rng.random(legal.shape) * legal, axis=1)
+
+
+def simulate_games(num_games: int, red_policy: Policy = random_policy, yellow_policy: Policy = random_policy,
+                   seed: Optional[int] = None) -> GameBatch:
+    """
+    Plays the specified number of games simultaneously and returns the finished batch.
+    """
+    batch = GameBatch(num_games)
+    batch.run(red_policy, yellow_policy, np.random.default_rng(seed))
+    return batch
+
+
+def run_games_random_batch(num_games: int, batch_size: int = 100000, seed: Optional[int] = None) -> dict[str, int]:
+    """
+    Runs the specified number of games between two random players, batch_size games at a time.
+
+    Returns the same statistics as manager.run_games_random.
+    """
+    num_wins_by_colour = {'red': 0, 'yellow': 0, 'draw': 0}
+    rng = np.random.default_rng(seed)
+
+    for start in range(0, num_games, batch_size):
+        batch = GameBatch(min(batch_size, num_games - start))
+        batch.run(random_policy, random_policy, rng)
+        for colour, count in batch.stats().items():
+            num_wins_by_colour[colour] += count
+
+    return num_wins_by_colour
+
+
+def run_games_random_batch_for_data(num_games: int, filename: str, batch_size: int = 100000,
+                                    seed: Optional[int] = None) -> dict[str, int]:
+    """
+    Runs the specified number of games between two random players, and saves the move sequence and winner of each
+    game in a game record file (see game_records), like manager.run_games_random_for_data.
+    """
+    num_wins_by_colour = {'red': 0, 'yellow': 0, 'draw': 0}
+    rng = np.random.default_rng(seed)
+
+    with GameRecordWriter(filename) as writer:
+        for start in range(0, num_games, batch_size):
+            batch = GameBatch(min(batch_size, num_games - start))
+            batch.run(random_policy, random_policy, rng)
+            for colour, count in batch.stats().items():
+                num_wins_by_colour[colour] += count
+
+            for game in range(len(batch.winners)):
+                writer.write(batch.move_sequence(game), batch.winner(game))
+
+    return num_wins_by_colour
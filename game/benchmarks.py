@@ -0,0 +1,279 @@
+"""
+Benchmarks of the board, MoveTree and whole-game hot paths.
+
+Each benchmark is run once to warm up, then timed several times and reported in operations per second (the median
+run), along with the spread of the timed runs (their range as a fraction of the median) and the peak memory allocated
+during one extra run (measured with tracemalloc, which is too slow to leave on while timing). Results can be saved as a
+baseline JSON file, and later runs compared against it: a benchmark that is slower than the baseline by more than both
+the tolerance and the spread measured in the two runs, or uses more memory by more than the tolerance, is a regression,
+and makes the command exit with status 1.
+
+Run from the game directory, so that the data files can be found:
+    python benchmarks.py --save-baseline baseline.json
+    python benchmarks.py --baseline baseline.json
+"""
+from __future__ import annotations
+from manager import *
+from learning_player import MoveTree, LearningPlayer, GAME_START_MOVE, load_move_tree
+from game_records import read_game_records
+from typing import Any, Callable
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+# a benchmark is set up with a scale factor, and returns a function that runs it once and returns how many operations
+# it performed
+Benchmark = Callable[[float], Callable[[], int]]
+
+
+def _filled_board(board_type: type) -> Union[Board, BitBoard]:
+    """
+    Returns a board with a fixed half-played game on it, and no four in a row.
+    """
+    board = board_type()
+    for index, column in enumerate('DDCEECFBBAGGDDCF'):
+        board.add_piece('red' if index % 2 == 0 else 'yellow', column)
+    return board
+
+
+def bench_construct(board_type: type) -> Benchmark:
+    """
+    Creating empty boards.
+    """
+    def setup(scale: float) -> Callable[[], int]:
+        count = int(2000 * scale)
+
+        def run() -> int:
+            for _ in range(count):
+                board_type()
+            return count
+        return run
+    return setup
+
+
+def bench_add_remove(board_type: type) -> Benchmark:
+    """
+    Adding a piece to each column of a half-full board and removing it again.
+    """
+    def setup(scale: float) -> Callable[[], int]:
+        count = int(20000 * scale)
+        board = _filled_board(board_type)
+
+        def run() -> int:
+            add_piece, remove_piece = board.add_piece, board.remove_piece
+            for _ in range(count):
+                for column in COLUMNS:
+                    add_piece('red', column)
+                    remove_piece(column)
+            return 14 * count
+        return run
+    return setup
+
+
+def bench_check_win(board_type: type) -> Benchmark:
+    """
+    Checking for a win at the top piece of each column of a half-full board.
+    """
+    def setup(scale: float) -> Callable[[], int]:
+        count = int(20000 * scale)
+        board = _filled_board(board_type)
+        locations = [(column, board.heights[column]) for column in COLUMNS if board.heights[column] > 0]
+
+        def run() -> int:
+            check_win = board.check_win
+            for _ in range(count):
+                for location in locations:
+                    check_win(location)
+            return count * len(locations)
+        return run
+    return setup
+
+
+def bench_full_board(board_type: type) -> Benchmark:
+    """
+    Checking whether a half-full board is full.
+    """
+    def setup(scale: float) -> Callable[[], int]:
+        count = int(200000 * scale)
+        board = _filled_board(board_type)
+
+        def run() -> int:
+            full_board = board.full_board
+            for _ in range(count):
+                full_board()
+            return count
+        return run
+    return setup
+
+
+def bench_tree_insert(scale: float) -> Callable[[], int]:
+    """
+    Inserting the games of data/50k_games_learning.csv into an empty MoveTree, from memory.
+    """
+    games = [(move_sequence, 1.0 if winner == 'red' else -1.0)
+             for move_sequence, winner in read_game_records('data/50k_games_learning.csv')]
+    games = games[:int(len(games) * min(scale, 1.0))]
+
+    def run() -> int:
+        tree = MoveTree(GAME_START_MOVE)
+        for move_sequence, win_probability in games:
+            tree.insert_move_sequence(move_sequence, win_probability)
+        return len(games)
+    return run
+
+
+def bench_insert_games_from_csv(scale: float) -> Callable[[], int]:
+    """
+    LearningPlayer.insert_games_from_csv on a whole data file (a small one when scale < 1).
+    """
+    filename = 'data/50k_games_learning.csv' if scale >= 1 else 'data/1000_games_random.csv'
+    num_games = sum(1 for _ in read_game_records(filename))
+
+    def run() -> int:
+        player = LearningPlayer('red', MoveTree(GAME_START_MOVE), 1.0)
+        player.insert_games_from_csv(filename)
+        return num_games
+    return run
+
+
+def bench_random_games(scale: float) -> Callable[[], int]:
+    """
+    Whole games between two RandomPlayers.
+    """
+    count = int(500 * scale)
+
+    def run() -> int:
+        for _ in range(count):
+            GameManager(RandomPlayer(), RandomPlayer()).run_game()
+        return count
+    return run
+
+
+def bench_learning_games(scale: float) -> Callable[[], int]:
+    """
+    Whole games between a LearningPlayer, trained on data/50k_games_learning.csv, and a RandomPlayer.
+    """
+    count = int(500 * scale)
+    tree = load_move_tree('data/50k_games_learning.csv')
+
+    def run() -> int:
+        for _ in range(count):
+            GameManager(LearningPlayer('red', tree, 1.0), RandomPlayer()).run_game()
+        return count
+    return run
+
+
+BENCHMARKS = {
+    'board.construct': bench_construct(Board),
+    'board.add_remove_piece': bench_add_remove(Board),
+    'board.check_win': bench_check_win(Board),
+    'board.full_board': bench_full_board(Board),
+    'bitboard.construct': bench_construct(BitBoard),
+    'bitboard.add_remove_piece': bench_add_remove(BitBoard),
+    'bitboard.check_win': bench_check_win(BitBoard),
+    'bitboard.full_board': bench_full_board(BitBoard),
+    'tree.insert_move_sequence': bench_tree_insert,
+    'tree.insert_games_from_csv': bench_insert_games_from_csv,
+    'game.random_vs_random': bench_random_games,
+    'game.learning_vs_random': bench_learning_games,
+}
+
+
+def run_benchmarks(names: list[str], scale: float = 1.0, repeat: int = 5) -> dict[str, dict[str, float]]:
+    """
+    Runs the named benchmarks, and returns the median operations per second, its spread and the peak memory in bytes
+    of each one.
+    """
+    results = {}
+    for name in names:
+        run = BENCHMARKS[name](scale)
+        run()  # warms up the caches and the allocator, so that the first timed run is not slower than the others
+        rates = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            operations = run()
+            rates.append(operations / (time.perf_counter() - start))
+        median = statistics.median(rates)
+
+        tracemalloc.start()
+        run()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results[name] = {'ops_per_sec': median, 'spread': (max(rates) - min(rates)) / median,
+                         'peak_memory_bytes': peak_memory}
+    return results
+
+
+def compare(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]],
+            tolerance: float) -> list[str]:
+    """
+    Returns a description of every regression in results compared to the baseline.
+
+    A benchmark regresses if its operations per second fall by more than the tolerance (a fraction of the baseline)
+    and by more than the spread of the two runs added up, since a smaller change cannot be told apart from noise, or if
+    its peak memory grows by more than the tolerance. Benchmarks that are not in the baseline are not compared.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        noise = result.get('spread', 0.0) + expected.get('spread', 0.0)
+        if result['ops_per_sec'] < expected['ops_per_sec'] * (1 - max(tolerance, noise)):
+            regressions.append(f'{name}: {result["ops_per_sec"]:,.0f} ops/sec, baseline '
+                               f'{expected["ops_per_sec"]:,.0f}')
+        if result['peak_memory_bytes'] > expected['peak_memory_bytes'] * (1 + tolerance):
+            regressions.append(f'{name}: peak memory {result["peak_memory_bytes"]:,} bytes, baseline '
+                               f'{expected["peak_memory_bytes"]:,}')
+    return regressions
+
+
+def main(arguments: Optional[list[str]] = None) -> int:
+    """
+    Runs the benchmarks from the command line, and returns the exit status.
+    """
+    parser = argparse.ArgumentParser(description='Benchmarks the board, tree and game hot paths.')
+    parser.add_argument('names', nargs='*', metavar='benchmark', help=f'from: {", ".join(BENCHMARKS)} (default all)')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplies the amount of work in each benchmark')
+    parser.add_argument('--repeat', type=int, default=5, help='the number of timed runs of each benchmark')
+    parser.add_argument('--baseline', help='a baseline JSON file to compare the results against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='the fraction the results may be worse than the baseline before failing')
+    parser.add_argument('--save-baseline', help='saves the results as a baseline JSON file')
+    args = parser.parse_args(arguments)
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f'unknown benchmarks: {", ".join(unknown)}')
+    baseline: dict[str, Any] = {}
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            saved = json.load(file)
+        if saved['scale'] != args.scale:
+            parser.error(f'the baseline was run with --scale {saved["scale"]}')
+        baseline = saved['results']
+
+    results = run_benchmarks(args.names or list(BENCHMARKS), args.scale, args.repeat)
+    for name, result in results.items():
+        line = f'{name:30} {result["ops_per_sec"]:>14,.0f} ops/sec ±{result["spread"] / 2:>6.1%} ' \
+               f'{result["peak_memory_bytes"] / 2 ** 20:>9.2f} MiB'
+        if name in baseline:
+            line += f' ({result["ops_per_sec"] / baseline[name]["ops_per_sec"] - 1:+.1%} vs baseline)'
+        print(line)
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, 'w') as file:
+            json.dump({'python': sys.version, 'scale': args.scale, 'results': results}, file, indent=2)
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}', file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
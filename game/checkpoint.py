@@ -0,0 +1,172 @@
+"""
+Keeps a MoveTree that is still learning saved on disk, so that no learning is lost when the program exits.
+
+A checkpoint directory holds a snapshot of the tree (a MoveTree file) and a journal of the games learned since the
+snapshot was taken (a game record file, see game_records). Each learned game is appended to the journal as soon as it is
+inserted, and every compact_every games the tree is saved as a new snapshot and the journal starts again empty.
+
+Both files are numbered with the snapshot's generation: snapshot-000003.mtree goes with journal-000003.csv. A new
+snapshot is written under a temporary name and then renamed, and the files of older generations are only removed
+afterwards, so the newest snapshot on disk is always complete and its journal holds exactly the games it is missing.
+"""
+from __future__ import annotations
+from typing import Callable, Optional
+from learning_player import MoveTree
+from game_records import GameRecordReader, GameRecordWriter
+from connect4 import COLUMNS
+import os
+import re
+
+_SNAPSHOT_PATTERN = re.compile(r'snapshot-(\d+)\.mtree$')
+_WINNERS = ('red', 'yellow', 'draw')
+
+
+class MoveTreeCheckpoint:
+    """
+    A MoveTree together with the snapshot and journal files it is saved in.
+
+    Instance Attributes:
+        - directory: the directory the snapshot and journal are kept in
+        - colour: the colour of the player that learns from the tree
+        - compact_every: the number of games the journal holds before it is compacted into a new snapshot
+        - tree: the tree, including every game recorded so far
+        - generation: the number of the current snapshot
+        - journal_games: the number of games in the current journal
+    """
+    directory: str
+    colour: str
+    compact_every: int
+    tree: MoveTree
+    generation: int
+    journal_games: int
+    _journal: Optional[GameRecordWriter]
+
+    def __init__(self, directory: str, build_tree: Callable[[], MoveTree], colour: str = 'red',
+                 compact_every: int = 100):
+        """
+        Loads the newest snapshot in directory and replays its journal. If the directory has no snapshot yet, the tree
+        is built with build_tree and saved as the first snapshot.
+        """
+        self.directory = directory
+        self.colour = colour
+        self.compact_every = compact_every
+        self._journal = None
+        os.makedirs(directory, exist_ok=True)
+
+        generations = [int(match.group(1)) for match in map(_SNAPSHOT_PATTERN.match, os.listdir(directory)) if match]
+        if generations:
+            self.generation = max(generations)
+            self.tree = MoveTree.load(self._snapshot_filename(self.generation))
+            self.journal_games = self._replay_journal()
+        else:
+            self.generation = 0
+            self.tree = build_tree()
+            self.journal_games = 0
+            self._save_snapshot()
+        self._remove_old_generations()
+
+    def __enter__(self) -> MoveTreeCheckpoint:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _snapshot_filename(self, generation: int) -> str:
+        return os.path.join(self.directory, f'snapshot-{generation:06d}.mtree')
+
+    def _journal_filename(self, generation: int) -> str:
+        return os.path.join(self.directory, f'journal-{generation:06d}.csv')
+
+    def record_game(self, move_sequence: list[str], winner: Optional[str]) -> None:
+        """
+        Inserts a finished game into the tree and appends it to the journal. A winner of None is a draw.
+
+        The journal is flushed before returning, so the game survives the program exiting or crashing.
+        """
+        winner = winner or 'draw'
+        self.tree.insert_move_sequence(move_sequence, self._game_value(winner))
+
+        if self._journal is None:
+            self._journal = GameRecordWriter(self._journal_filename(self.generation), append=True)
+        self._journal.write(move_sequence, winner)
+        self._journal.flush()
+        self.journal_games += 1
+
+        if self.journal_games >= self.compact_every:
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Saves the tree as a new snapshot, and removes the previous snapshot and its journal.
+        """
+        self.close()
+        self.generation += 1
+        self._save_snapshot()
+        self.journal_games = 0
+        self._remove_old_generations()
+
+    def close(self) -> None:
+        """
+        Closes the journal. Recording another game opens it again.
+        """
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _game_value(self, winner: str) -> float:
+        """
+        Returns the value a game won by winner is inserted into the tree with, the same as in ui.ai_game.
+        """
+        if winner == 'draw':
+            return 0.0
+        return 1.0 if winner == self.colour else -1.0
+
+    def _save_snapshot(self) -> None:
+        """
+        Saves the tree as the snapshot of the current generation.
+        """
+        filename = self._snapshot_filename(self.generation)
+        self.tree.save(filename + '.tmp')
+        os.replace(filename + '.tmp', filename)
+
+    def _replay_journal(self) -> int:
+        """
+        Inserts the games in the current journal into the tree, and returns how many there were.
+
+        A record left incomplete by a crash can only be the last one in the journal; it is cut off the file. Since a
+        crash can also happen between writing a winner and the newline after it, the last record only counts if the
+        journal ends with a newline, so that the next record is never appended to a partly written line.
+        """
+        filename = self._journal_filename(self.generation)
+        if not os.path.exists(filename):
+            return 0
+
+        size = os.path.getsize(filename)
+        with open(filename, 'rb') as file:
+            file.seek(max(size - 1, 0))
+            ends_with_newline = file.read(1) == b'\n'
+
+        num_games = 0
+        valid_size = 0
+        with GameRecordReader(filename) as reader:
+            for move_sequence, winner in reader:
+                if (reader.offset == size and not ends_with_newline) or winner not in _WINNERS or \
+                        not all(move in COLUMNS for move in move_sequence):
+                    break
+                self.tree.insert_move_sequence(move_sequence, self._game_value(winner))
+                num_games += 1
+                valid_size = reader.offset
+
+        if size > valid_size:
+            os.truncate(filename, valid_size)
+        return num_games
+
+    def _remove_old_generations(self) -> None:
+        """
+        Removes the snapshots and journals of earlier generations, and any unfinished snapshots.
+        """
+        current = {os.path.basename(self._snapshot_filename(self.generation)),
+                   os.path.basename(self._journal_filename(self.generation))}
+        for name in os.listdir(self.directory):
+            if (name.startswith('snapshot-') or name.startswith('journal-')) and name not in current:
+                os.remove(os.path.join(self.directory, name))
@@ -2,6 +2,7 @@
 A representation of the classic Connect 4 game.
 
 A graph is used to represent the board, with its vertices being the individual game pieces.
+BitBoard is a faster alternative that packs each player's pieces into a single integer.
 """
 from __future__ import annotations
 from typing import Optional
@@ -9,6 +10,25 @@ from typing import Optional
 COLUMNS = ['A', 'B', 'C', 'D', 'E', 'F', 'G']
 
 
+def _winning_lines() -> list[tuple[tuple[str, int], ...]]:
+    """
+    Returns every line of four locations that wins the game (69 in total).
+    """
+    lines = []
+    for c in range(7):
+        for r in range(1, 7):
+            for dc, dr in ((1, 0), (0, 1), (1, 1), (1, -1)):
+                if 0 <= c + 3 * dc < 7 and 1 <= r + 3 * dr <= 6:
+                    lines.append(tuple((COLUMNS[c + i * dc], r + i * dr) for i in range(4)))
+    return lines
+
+
+WINNING_LINES = _winning_lines()
+# the winning lines that pass through each location, used by Board.check_win
+LINES_THROUGH = {(column, row): [line for line in WINNING_LINES if (column, row) in line]
+                 for column in COLUMNS for row in range(1, 7)}
+
+
 class _Vertex:
     """
     A single game piece.
@@ -132,11 +152,17 @@ class Board:
 
     Instance Attributes:
         - vertices: the vertices that make up this graph
+        - heights: the number of pieces in each column
+        - num_pieces: the total number of pieces on the board
     """
     vertices: dict[tuple[str, int], _Vertex]
+    heights: dict[str, int]
+    num_pieces: int
 
     def __init__(self):
         self.vertices = {}
+        self.heights = {column: 0 for column in COLUMNS}
+        self.num_pieces = 0
 
         for letter in COLUMNS:
             for i in range(1, 7):
@@ -150,24 +176,35 @@ class Board:
         Adds a piece to the board in the specified column.
         The piece will be added to the lowest available spot in the column.
         """
-        for i in range(1, 7):
-            if self.vertices[(column, i)].colour == 'grey':
-                self.vertices[(column, i)].colour = colour
-                return
-        else:
+        height = self.heights[column]
+        if height >= 6:
             raise ValueError
+        self.vertices[(column, height + 1)].colour = colour
+        self.heights[column] = height + 1
+        self.num_pieces += 1
 
     def remove_piece(self, column: str) -> None:
         """
         Removes the last placed piece from the specfied column.
         """
-        for i in range(2, 7):
-            if self.vertices[(column, i)].colour == 'grey':
-                self.vertices[(column, i - 1)].colour = 'grey'
-                return
-            elif i == 6 and self.vertices[(column, i)] != 'grey':
-                self.vertices[(column, i)].colour = 'grey'
-                return
+        height = self.heights[column]
+        if height == 0:
+            return
+        self.vertices[(column, height)].colour = 'grey'
+        self.heights[column] = height - 1
+        self.num_pieces -= 1
+
+    def is_playable(self, column: str) -> bool:
+        """
+        Returns whether another piece can be added to the specified column.
+        """
+        return self.heights[column] < 6
+
+    def next_free_row(self, column: str) -> int:
+        """
+        Returns the row that the next piece added to the specified column will land in (7 if the column is full).
+        """
+        return self.heights[column] + 1
 
     def connect_board(self):
         """
@@ -216,19 +253,138 @@ class Board:
     def check_win(self, location: tuple[str, int]) -> bool:
         """
         Checks if the last played move has resulted in a win.
+
+        Only the (at most 13) precomputed winning lines through location are checked.
+        """
+        vertices = self.vertices
+        colour = vertices[location].colour
+        for a, b, c, d in LINES_THROUGH[location]:
+            if vertices[a].colour == colour and vertices[b].colour == colour and vertices[c].colour == colour \
+                    and vertices[d].colour == colour:
+                return True
+        return False
+
+    def full_board(self) -> bool:
+        """
+        Returns whether the board is completely filled up or not.
+        """
+        return self.num_pieces == 42
+
+
+# Bit layout used by BitBoard: column c, row r (both 0-indexed, row 0 is the bottom) is bit c * 7 + r.
+# The 7th bit of every column is a sentinel that is always empty, so shifted lines never wrap between columns.
+BIT_COLUMN_HEIGHT = 7
+BOTTOM_MASK = sum(1 << (c * BIT_COLUMN_HEIGHT) for c in range(7))
+BOARD_MASK = BOTTOM_MASK * ((1 << 6) - 1)
+
+
+def has_alignment(bits: int) -> bool:
+    """
+    Returns whether the given bitboard contains four pieces in a row in any direction.
+    """
+    # horizontal
+    pairs = bits & (bits >> BIT_COLUMN_HEIGHT)
+    if pairs & (pairs >> (2 * BIT_COLUMN_HEIGHT)):
+        return True
+    # diagonal: \
+    pairs = bits & (bits >> (BIT_COLUMN_HEIGHT - 1))
+    if pairs & (pairs >> (2 * (BIT_COLUMN_HEIGHT - 1))):
+        return True
+    # diagonal: /
+    pairs = bits & (bits >> (BIT_COLUMN_HEIGHT + 1))
+    if pairs & (pairs >> (2 * (BIT_COLUMN_HEIGHT + 1))):
+        return True
+    # vertical
+    pairs = bits & (bits >> 1)
+    return (pairs & (pairs >> 2)) != 0
+
+
+class BitBoard:
+    """
+    A game board for Connect 4 that stores each player's pieces as the set bits of an integer.
+    Has the same interface as Board, so the two can be used interchangeably.
+
+    Instance Attributes:
+        - pieces: the bitboard of each colour's pieces
+        - heights: the number of pieces in each column
+        - num_pieces: the total number of pieces on the board
+    """
+    pieces: dict[str, int]
+    heights: dict[str, int]
+    num_pieces: int
+
+    def __init__(self):
+        self.pieces = {'red': 0, 'yellow': 0}
+        self.heights = {column: 0 for column in COLUMNS}
+        self.num_pieces = 0
+
+    def add_piece(self, colour: str, column: str) -> None:
+        """
+        Adds a piece to the board in the specified column.
+        The piece will be added to the lowest available spot in the column.
+        """
+        height = self.heights[column]
+        if height >= 6:
+            raise ValueError
+        self.pieces[colour] |= 1 << ((ord(column) - 65) * BIT_COLUMN_HEIGHT + height)
+        self.heights[column] = height + 1
+        self.num_pieces += 1
+
+    def remove_piece(self, column: str) -> None:
+        """
+        Removes the last placed piece from the specfied column.
+        """
+        height = self.heights[column]
+        if height == 0:
+            return
+        bit = ~(1 << ((ord(column) - 65) * BIT_COLUMN_HEIGHT + height - 1))
+        self.pieces['red'] &= bit
+        self.pieces['yellow'] &= bit
+        self.heights[column] = height - 1
+        self.num_pieces -= 1
+
+    def is_playable(self, column: str) -> bool:
+        """
+        Returns whether another piece can be added to the specified column.
         """
-        vertex = self.vertices[location]
-        if vertex.num_colour_vertical(vertex.colour, set()) >= 4:
-            return True
-        elif vertex.num_colour_horizontal(vertex.colour, set()) >= 4:
-            return True
-        elif vertex.num_colour_right_diagonal(vertex.colour, set()) >= 4:
-            return True
+        return self.heights[column] < 6
+
+    def next_free_row(self, column: str) -> int:
+        """
+        Returns the row that the next piece added to the specified column will land in (7 if the column is full).
+        """
+        return self.heights[column] + 1
+
+    def colour_at(self, location: tuple[str, int]) -> str:
+        """
+        Returns the colour of the piece at the given location, or grey if the spot is empty.
+        """
+        bit = 1 << ((ord(location[0]) - 65) * BIT_COLUMN_HEIGHT + location[1] - 1)
+        if self.pieces['red'] & bit:
+            return 'red'
+        elif self.pieces['yellow'] & bit:
+            return 'yellow'
         else:
-            return vertex.num_colour_left_diagonal(vertex.colour, set()) >= 4
+            return 'grey'
+
+    def print_board(self):
+        """
+        Prints a text representation of the board. Purely for debugging purposes.
+        """
+        for row in range(6, 0, -1):
+            print(' '.join(self.colour_at((column, row))[0].upper() for column in COLUMNS))
+
+    def check_win(self, location: tuple[str, int]) -> bool:
+        """
+        Checks if the last played move has resulted in a win.
+        """
+        colour = self.colour_at(location)
+        if colour == 'grey':
+            return False
+        return has_alignment(self.pieces[colour])
 
     def full_board(self) -> bool:
         """
         Returns whether the board is completely filled up or not.
         """
-        return all(self.vertices[vertex].colour != 'grey' for vertex in self.vertices)
+        return self.num_pieces == 42
@@ -0,0 +1,287 @@
+"""
+Streaming reading and writing of game records.
+
+A game record file stores each game as two lines, in the format of the files in data/: the game's moves, separated by
+commas, then the winner ('red', 'yellow' or 'draw').
+
+Files with a .c4g extension use a packed binary format instead. After an 8 byte header (PACKED_FILE_HEADER), each game
+is stored as one byte holding its number of moves, followed by a little endian integer of just enough bytes to hold
+its result in the lowest 2 bits (0 for a draw, 1 for red, 2 for yellow) and then 3 bits per move (the column's index).
+
+Files ending in .gz are gzip compressed, and files ending in .zst are zstandard compressed (which needs the zstandard
+package), whatever their format.
+
+Records are read one at a time, so a file never has to fit in memory, and a reader can be resumed from the offset it
+reached. Uncompressed packed files are memory-mapped rather than read.
+
+Running this module converts between formats: python game_records.py SOURCE DESTINATION
+"""
+from __future__ import annotations
+from typing import BinaryIO, Iterator, Optional
+import argparse
+import struct
+import gzip
+import mmap
+import os
+
+# The header of a packed game file: magic bytes, format version, reserved
+PACKED_FILE_HEADER = '<4sHH'
+PACKED_FILE_MAGIC = b'C4GP'
+PACKED_FILE_VERSION = 1
+_PACKED_HEADER = struct.pack(PACKED_FILE_HEADER, PACKED_FILE_MAGIC, PACKED_FILE_VERSION, 0)
+_RESULTS = ['draw', 'red', 'yellow']
+_RESULT_CODES = {'draw': 0, 'red': 1, 'yellow': 2}
+_COLUMNS = 'ABCDEFG'
+# the letters of every group of four 3 bit moves (codes 7 never appear in a game, and are decoded as '?')
+_QUADS = [''.join((_COLUMNS + '?')[(quad >> shift) & 7] for shift in (0, 3, 6, 9)) for quad in range(1 << 12)]
+# the number of bytes used to store a game with each possible number of moves
+_PACKED_SIZES = [(2 + 3 * num_moves + 7) // 8 for num_moves in range(43)]
+
+
+def is_packed(filename: str) -> bool:
+    """
+    Returns whether the given game record file uses the packed binary format.
+    """
+    for extension in ('.gz', '.zst'):
+        if filename.endswith(extension):
+            filename = filename[:-len(extension)]
+    return filename.endswith('.c4g')
+
+
+def pack_game(move_sequence: list[str], winner: Optional[str]) -> bytes:
+    """
+    Returns the packed binary record of a game. A winner of None is stored as a draw.
+    """
+    value = _RESULT_CODES[winner or 'draw']
+    shift = 2
+    for move in move_sequence:
+        value |= (ord(move) - 65) << shift
+        shift += 3
+    return bytes((len(move_sequence),)) + value.to_bytes(_PACKED_SIZES[len(move_sequence)], 'little')
+
+
+def unpack_game(num_moves: int, data) -> tuple[list[str], str]:
+    """
+    Returns the (move sequence, winner) stored in the given packed record, without its length byte.
+    """
+    value = int.from_bytes(data, 'little')
+    moves = value >> 2
+    # decode four moves (12 bits) at a time
+    letters = ''.join([_QUADS[(moves >> shift) & 0xFFF] for shift in range(0, 3 * num_moves, 12)])
+    return list(letters[:num_moves]), _RESULTS[value & 3]
+
+
+def _check_packed_header(header: bytes, filename: str) -> None:
+    """
+    Raises a ValueError if the given bytes are not the header of a packed game file of the current version.
+    """
+    if len(header) < len(_PACKED_HEADER) or header[:4] != PACKED_FILE_MAGIC:
+        raise ValueError(f'{filename} is not a packed game file')
+    version = struct.unpack_from(PACKED_FILE_HEADER, header)[1]
+    if version != PACKED_FILE_VERSION:
+        raise ValueError(f'{filename} has version {version}, expected version {PACKED_FILE_VERSION}')
+
+
+def open_game_file(filename: str, mode: str = 'rb') -> BinaryIO:
+    """
+    Opens a game record file in binary mode ('rb', 'wb' or 'ab'), compressed according to its extension.
+    """
+    if filename.endswith('.gz'):
+        return gzip.open(filename, mode)
+    elif filename.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('the zstandard package is needed to read and write .zst game files') from None
+        return zstandard.open(filename, mode)
+    else:
+        return open(filename, mode)
+
+
+class GameRecordReader:
+    """
+    Reads (move sequence, winner) records from a game record file, one at a time.
+
+    Instance Attributes:
+        - filename: the file being read
+        - offset: the position in the (uncompressed) file just after the last record read. A new reader started at
+        this offset continues with the next record.
+    """
+    filename: str
+    offset: int
+    _file: Optional[BinaryIO]
+
+    def __init__(self, filename: str, offset: int = 0):
+        self.filename = filename
+        self.offset = offset
+        self._file = None
+
+    def __enter__(self) -> GameRecordReader:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the file being read.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __iter__(self) -> Iterator[tuple[list[str], str]]:
+        if self._file is None:
+            self._file = open_game_file(self.filename)
+            if is_packed(self.filename):
+                _check_packed_header(self._file.read(len(_PACKED_HEADER)), self.filename)
+                self.offset = max(self.offset, len(_PACKED_HEADER))
+            if self.offset:
+                self._file.seek(self.offset)
+
+        if not is_packed(self.filename):
+            yield from self._read_text()
+        elif self.filename.endswith('.c4g'):
+            yield from self._read_packed_mmap()
+        else:
+            yield from self._read_packed_stream()
+
+    def _read_text(self) -> Iterator[tuple[list[str], str]]:
+        """
+        Yields the records of a text game file.
+        """
+        file = self._file
+        while True:
+            moves_line = file.readline()
+            winner_line = file.readline()
+            if not winner_line:
+                return
+            self.offset += len(moves_line) + len(winner_line)
+            moves = moves_line.rstrip(b'\r\n')
+            yield moves.decode('ascii').split(',') if moves else [], winner_line.rstrip(b'\r\n').decode('ascii')
+
+    def _read_packed_mmap(self) -> Iterator[tuple[list[str], str]]:
+        """
+        Yields the records of an uncompressed packed game file, by memory-mapping it.
+        """
+        if self._file.seek(0, 2) == 0:
+            return
+        with mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            view = memoryview(data)
+            end = len(data)
+            offset = self.offset
+            try:
+                while offset < end:
+                    num_moves = data[offset]
+                    next_offset = offset + 1 + _PACKED_SIZES[num_moves]
+                    record = unpack_game(num_moves, view[offset + 1:next_offset])
+                    offset = self.offset = next_offset
+                    yield record
+            finally:
+                view.release()
+
+    def _read_packed_stream(self) -> Iterator[tuple[list[str], str]]:
+        """
+        Yields the records of a compressed packed game file.
+        """
+        file = self._file
+        while True:
+            length = file.read(1)
+            if not length:
+                return
+            num_moves = length[0]
+            data = file.read(_PACKED_SIZES[num_moves])
+            self.offset += 1 + len(data)
+            yield unpack_game(num_moves, data)
+
+
+def read_game_records(filename: str, offset: int = 0) -> Iterator[tuple[list[str], str]]:
+    """
+    Yields the (move sequence, winner) of every game in a game record file, starting at the given offset.
+    """
+    with GameRecordReader(filename, offset) as reader:
+        yield from reader
+
+
+def read_game_batches(filename: str, batch_size: int, offset: int = 0) -> Iterator[list[tuple[list[str], str]]]:
+    """
+    Yields the games in a game record file in lists of batch_size games (the last list may be shorter).
+    """
+    batch = []
+    for record in read_game_records(filename, offset):
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class GameRecordWriter:
+    """
+    Writes (move sequence, winner) records to a game record file.
+
+    Instance Attributes:
+        - filename: the file being written
+    """
+    filename: str
+    _file: BinaryIO
+
+    def __init__(self, filename: str, append: bool = False):
+        self.filename = filename
+        is_new_file = not append or not os.path.exists(filename) or os.path.getsize(filename) == 0
+        self._file = open_game_file(filename, 'ab' if append else 'wb')
+        if is_packed(filename) and is_new_file:
+            self._file.write(_PACKED_HEADER)
+
+    def __enter__(self) -> GameRecordWriter:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, move_sequence: list[str], winner: Optional[str]) -> None:
+        """
+        Writes one game. A winner of None is written as a draw.
+        """
+        if winner is None:
+            winner = 'draw'
+        if is_packed(self.filename):
+            self._file.write(pack_game(move_sequence, winner))
+        else:
+            self._file.write(f'{",".join(move_sequence)}\n{winner}\n'.encode('ascii'))
+
+    def flush(self) -> None:
+        """
+        Flushes the records written so far to the file.
+        """
+        self._file.flush()
+
+    def close(self) -> None:
+        """
+        Closes the file being written.
+        """
+        self._file.close()
+
+
+def convert_game_file(source: str, destination: str) -> int:
+    """
+    Copies every game in source to destination, converting between formats according to their extensions.
+
+    Returns the number of games copied.
+    """
+    num_games = 0
+    with GameRecordWriter(destination) as writer:
+        for move_sequence, winner in read_game_records(source):
+            writer.write(move_sequence, winner)
+            num_games += 1
+    return num_games
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Converts a game record file between the text and packed formats.')
+    parser.add_argument('source')
+    parser.add_argument('destination')
+    args = parser.parse_args()
+
+    print(f'Converted {convert_game_file(args.source, args.destination)} games')
@@ -0,0 +1,206 @@
+"""
+Opt-in counters for finding out where the time goes in a game.
+
+Instrumentation is off by default, and costs one flag check per game and per move while it is off. After enable():
+    - GameManager records how long each player takes to choose each move, and plays on a board that counts its
+    check_win calls and its mutations (add_piece and remove_piece, including the trial moves players make)
+    - LearningPlayer records whether each lookup of the opponent's move in its tree found it, how often its tree is
+    lost (past_games becomes None), and how many moves it makes without one
+
+The counters keep adding up until reset() is called, for example around run_learning_algorithm, and stats() returns
+them as a dictionary that can be saved as JSON with save_stats. Tournaments played with instrumentation enabled collect
+the counters from their worker processes, and include them in their results.
+"""
+from __future__ import annotations
+from connect4 import Board, BitBoard
+from typing import Any, Optional
+import json
+
+enabled = False
+
+
+class Counters:
+    """
+    The raw instrumentation counters.
+
+    Instance Attributes:
+        - games: the number of games started
+        - check_win_calls: the number of calls to check_win
+        - board_mutations: the number of pieces added to and removed from boards
+        - move_latency: the number of moves, total seconds and slowest move in seconds, by player name (see
+        GameManager.player_names)
+        - tree_hits: the number of LearningPlayer tree lookups that found the opponent's move
+        - tree_misses: the number of LearningPlayer tree lookups that did not
+        - trees_lost: the number of times a LearningPlayer's past_games became None
+        - moves_without_tree: the number of moves a LearningPlayer made with past_games None
+    """
+    games: int
+    check_win_calls: int
+    board_mutations: int
+    move_latency: dict[str, list]
+    tree_hits: int
+    tree_misses: int
+    trees_lost: int
+    moves_without_tree: int
+
+    def __init__(self):
+        self.games = 0
+        self.check_win_calls = 0
+        self.board_mutations = 0
+        self.move_latency = {}
+        self.tree_hits = 0
+        self.tree_misses = 0
+        self.trees_lost = 0
+        self.moves_without_tree = 0
+
+    def merge(self, other: Counters) -> None:
+        """
+        Adds the counts of other to these counters.
+        """
+        self.games += other.games
+        self.check_win_calls += other.check_win_calls
+        self.board_mutations += other.board_mutations
+        for name, (moves, seconds, slowest) in other.move_latency.items():
+            latency = self.move_latency.setdefault(name, [0, 0.0, 0.0])
+            latency[0] += moves
+            latency[1] += seconds
+            latency[2] = max(latency[2], slowest)
+        self.tree_hits += other.tree_hits
+        self.tree_misses += other.tree_misses
+        self.trees_lost += other.trees_lost
+        self.moves_without_tree += other.moves_without_tree
+
+
+counters = Counters()
+
+
+def enable() -> None:
+    """
+    Turns instrumentation on. Only games started afterwards are counted.
+    """
+    global enabled
+    enabled = True
+
+
+def disable() -> None:
+    """
+    Turns instrumentation off. The counters are kept.
+    """
+    global enabled
+    enabled = False
+
+
+def reset() -> None:
+    """
+    Sets every counter back to zero.
+    """
+    global counters
+    counters = Counters()
+
+
+def take() -> Counters:
+    """
+    Returns the counters and resets them.
+    """
+    taken = counters
+    reset()
+    return taken
+
+
+def record_move_latency(name: str, seconds: float) -> None:
+    """
+    Records that the player with the given name took the given number of seconds to choose a move.
+    """
+    latency = counters.move_latency.setdefault(name, [0, 0.0, 0.0])
+    latency[0] += 1
+    latency[1] += seconds
+    if seconds > latency[2]:
+        latency[2] = seconds
+
+
+def record_tree_lookup(found: bool) -> None:
+    """
+    Records a LearningPlayer looking up the opponent's move in its tree. A lookup that fails also loses the tree.
+    """
+    if found:
+        counters.tree_hits += 1
+    else:
+        counters.tree_misses += 1
+        counters.trees_lost += 1
+
+
+def stats() -> dict[str, Any]:
+    """
+    Returns the counters as a dictionary, with averages per game and per move.
+    """
+    games = counters.games
+    lookups = counters.tree_hits + counters.tree_misses
+    return {
+        'games': games,
+        'board': {
+            'check_win_calls': counters.check_win_calls,
+            'mutations': counters.board_mutations,
+            'check_win_calls_per_game': counters.check_win_calls / games if games else 0.0,
+            'mutations_per_game': counters.board_mutations / games if games else 0.0,
+        },
+        'move_latency': {
+            name: {'moves': moves, 'total_seconds': seconds, 'mean_ms': 1000 * seconds / moves,
+                   'max_ms': 1000 * slowest}
+            for name, (moves, seconds, slowest) in counters.move_latency.items()
+        },
+        'move_tree': {
+            'hits': counters.tree_hits,
+            'misses': counters.tree_misses,
+            'hit_rate': counters.tree_hits / lookups if lookups else 0.0,
+            'trees_lost': counters.trees_lost,
+            'moves_without_tree': counters.moves_without_tree,
+        },
+    }
+
+
+def save_stats(filename: str) -> None:
+    """
+    Saves stats() to a JSON file.
+    """
+    with open(filename, 'w') as file:
+        json.dump(stats(), file, indent=2)
+
+
+class _CountingBoardMixin:
+    """
+    Counts the check_win calls and mutations of a board.
+    """
+
+    def add_piece(self, colour: str, column: str) -> None:
+        counters.board_mutations += 1
+        super().add_piece(colour, column)
+
+    def remove_piece(self, column: str) -> None:
+        counters.board_mutations += 1
+        super().remove_piece(column)
+
+    def check_win(self, location: tuple[str, int]) -> bool:
+        counters.check_win_calls += 1
+        return super().check_win(location)
+
+
+class CountingBoard(_CountingBoardMixin, Board):
+    """
+    A Board that counts its check_win calls and mutations.
+    """
+
+
+class CountingBitBoard(_CountingBoardMixin, BitBoard):
+    """
+    A BitBoard that counts its check_win calls and mutations.
+    """
+
+
+_COUNTING_BOARD_TYPES = {Board: CountingBoard, BitBoard: CountingBitBoard}
+
+
+def counting_board_type(board_type: type) -> type:
+    """
+    Returns the counting version of the given board type, or the type itself if there is none.
+    """
+    return _COUNTING_BOARD_TYPES.get(board_type, board_type)
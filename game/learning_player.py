@@ -3,9 +3,26 @@ Implements a player that 'learns' from past games to improve their performance.
 """
 from __future__ import annotations
 from manager import *
+from game_records import GameRecordWriter, read_game_records
+import instrumentation
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Iterable
+from array import array
 import random
+import math
+import struct
+import sys
+import mmap
+import os
+
+if TYPE_CHECKING:
+    from opening_book import OpeningBook
 
 GAME_START_MOVE = '*'
+# the win_probability of a finished game for each winner, from the red player's point of view
+WIN_PROBABILITIES = {'red': 1.0, 'yellow': -1.0, 'draw': 0.0}
+# the approximate memory used by each move in a MoveTree, in bytes (measured on CPython 3.11)
+MOVE_TREE_NODE_BYTES = 330
 
 
 class MoveTree:
@@ -17,15 +34,25 @@ class MoveTree:
         - win_probability: ranges from -1.0 to 1.0, -1.0 for a yellow win, 0.0 for a draw, 1.0 for a red win, otherwise
         the average of subtree's win_probability
         - subtrees: the possible moves following this move
+        - visits: the number of inserted move sequences that pass through this move
+        - subtree_win_probability_sum: the sum of the subtrees' win_probability, kept up to date by
+        insert_move_sequence so that win_probability never has to be recalculated from scratch
+        - collapsed_moves: None, unless prune has collapsed this move, in which case it holds the win_probability of
+        each move that followed it. A collapsed move has no subtrees, and its win_probability is the average of these.
     """
     root: str
     win_probability: float = 0
     subtrees: dict[str, MoveTree]
+    visits: int = 0
+    subtree_win_probability_sum: float = 0
+    collapsed_moves: Optional[dict[str, float]] = None  # a class default, so that only collapsed moves pay for it
 
     def __init__(self, root: str, win_probability: float = 0):
         self.root = root
         self.win_probability = win_probability
         self.subtrees = {}
+        self.visits = 0
+        self.subtree_win_probability_sum = 0
 
     def is_empty(self) -> bool:
         """
@@ -45,8 +72,8 @@ class MoveTree:
 
         win_probability of a tree is defined as the average win_probabilities of its subtrees.
         """
-        self.win_probability = sum(self.subtrees[subtree].win_probability for subtree in self.subtrees) / len(
-            self.subtrees)
+        self.subtree_win_probability_sum = sum(subtree.win_probability for subtree in self.subtrees.values())
+        self.win_probability = self.subtree_win_probability_sum / len(self.subtrees)
 
     def find_subtree_by_move(self, move: str) -> Optional[MoveTree]:
         """
@@ -59,30 +86,441 @@ class MoveTree:
         else:
             return None
 
-    def insert_move_sequence(self, sequence: list[str], win_probability: float):
+    def insert_move_sequence(self, sequence: list[str], win_probability: float) -> int:
+        """
+        Inserts the given sequence of moves into the MoveTree, and returns the number of moves added to the tree.
+
+        The last move of the sequence gets the given win_probability (replacing its old one if the sequence was already
+        in the tree), and every move before it is updated to the new average of its subtrees. Only the moves along the
+        sequence are updated, using their subtree_win_probability_sum, so this takes O(len(sequence)) time.
+
+        The sequence stops at a move collapsed by prune, since the moves below it are no longer known. If the next move
+        ends the game, or was not played from there before, its collapsed win_probability becomes the given one, as it
+        would in the full tree. Otherwise the game is only counted in the collapsed move's visits.
         """
-        Inserts the given sequence of moves into the MoveTree.
+        if len(sequence) == 0:
+            return 0
+
+        path = [self]
+        tree = self
+        num_added = 0
+        for i, move in enumerate(sequence):
+            if tree.collapsed_moves is not None:
+                if i == len(sequence) - 1 or move not in tree.collapsed_moves:
+                    tree.collapsed_moves[move] = win_probability
+                win_probability = sum(tree.collapsed_moves.values()) / len(tree.collapsed_moves)
+                break
+            subtree = tree.subtrees.get(move)
+            if subtree is None:  # a new move with a win_probability of 0, which does not change the parent's sum
+                subtree = MoveTree(move)
+                tree.subtrees[move] = subtree
+                num_added += 1
+            tree.visits += 1
+            path.append(subtree)
+            tree = subtree
+        tree.visits += 1
+
+        change = win_probability - tree.win_probability
+        tree.win_probability = win_probability
+        for i in range(len(path) - 2, -1, -1):
+            parent = path[i]
+            parent.subtree_win_probability_sum += change
+            old_win_probability = parent.win_probability
+            parent.win_probability = parent.subtree_win_probability_sum / len(parent.subtrees)
+            change = parent.win_probability - old_win_probability
+        return num_added
+
+    def size(self) -> int:
         """
-        self._insert_move_sequence_index(sequence, win_probability, 0)
+        Returns the number of moves in this tree, including its root.
+        """
+        num_moves = 0
+        stack = [self]
+        while stack:
+            tree = stack.pop()
+            num_moves += 1
+            stack.extend(tree.subtrees.values())
+        return num_moves
+
+    def prune(self, min_visits: int = 2, max_depth: Optional[int] = None, collapse_decided: bool = False) -> int:
+        """
+        Collapses the parts of this tree that are not worth keeping, and returns the number of moves removed.
+
+        A move below the root is collapsed into a leaf (its subtrees are removed) if it has fewer than min_visits
+        visits, if it is max_depth moves below the root, or, when collapse_decided is True, if its win_probability is
+        exactly 1.0 or -1.0. That means that the latest game to end at each position below it had the same result, not
+        that every game did, since each leaf only holds the result of the last game that ended there. A collapsed move
+        keeps its win_probability and visits, which summarise the games that were below it, so the win_probability of
+        every move that is kept is unchanged. The win_probability of each removed subtree is kept in collapsed_moves, so
+        later games through a collapsed move update its average instead of starting it again (see insert_move_sequence).
+        """
+        num_removed = 0
+        stack = [(subtree, 1) for subtree in self.subtrees.values()]
+        while stack:
+            tree, depth = stack.pop()
+            if not tree.subtrees:
+                continue
+            if tree.visits < min_visits or depth == max_depth or \
+                    (collapse_decided and abs(tree.win_probability) == 1.0):
+                num_removed += tree._collapse()
+            else:
+                stack.extend((subtree, depth + 1) for subtree in tree.subtrees.values())
+        return num_removed
 
-    def _insert_move_sequence_index(self, sequence: list[str], win_probability: float, index: int):
+    def _collapse(self) -> int:
         """
-        Inserts the given sequence of moves into the MoveTree starting at the given index.
+        Removes the subtrees of this move, keeping their win_probability in collapsed_moves, and returns the number of
+        moves removed.
         """
-        if index >= len(sequence):
-            return
-        else:
-            move_to_insert = sequence[index]
+        num_removed = self.size() - 1
+        self.collapsed_moves = {move: subtree.win_probability for move, subtree in self.subtrees.items()}
+        self.subtrees = {}
+        self.subtree_win_probability_sum = 0
+        return num_removed
+
+    def prune_to_size(self, max_size: int) -> int:
+        """
+        Prunes the moves with the fewest visits until this tree has at most max_size moves (or only the root and its
+        subtrees are left), and returns the number of moves removed.
+
+        This uses prune with the largest min_visits that leaves too many moves, and then collapses the moves with
+        exactly that many visits, deepest first, only until the tree is small enough. Since those moves only have
+        leaves left below them by then, each one removes at most len(COLUMNS) moves, so the tree ends up within
+        len(COLUMNS) moves of max_size.
+        """
+        # A move keeps its subtrees if it has at least min_visits visits. Since a move never has more visits than its
+        # parent, the tree left by a given min_visits is 1 + the number of subtrees of every move with enough visits.
+        subtrees_by_visits = {}
+        stack = list(self.subtrees.values())
+        while stack:
+            tree = stack.pop()
+            if tree.subtrees:
+                subtrees_by_visits[tree.visits] = subtrees_by_visits.get(tree.visits, 0) + len(tree.subtrees)
+                stack.extend(tree.subtrees.values())
+
+        size = 1 + len(self.subtrees)  # the root is never collapsed
+        boundary_visits = None
+        for visits in sorted(subtrees_by_visits, reverse=True):
+            size += subtrees_by_visits[visits]
+            if size > max_size:
+                boundary_visits = visits
+                break
+        if boundary_visits is None:
+            return 0
+
+        num_removed = self.prune(boundary_visits)
+        boundary = []
+        stack = [(subtree, 1) for subtree in self.subtrees.values()]
+        while stack:
+            tree, depth = stack.pop()
+            if tree.subtrees:
+                if tree.visits == boundary_visits:
+                    boundary.append((depth, tree))
+                stack.extend((subtree, depth + 1) for subtree in tree.subtrees.values())
+        boundary.sort(key=lambda item: item[0], reverse=True)  # stable, so the order is fixed for a given tree
+
+        for _, tree in boundary:
+            if size <= max_size:
+                break
+            removed = tree._collapse()
+            size -= removed
+            num_removed += removed
+        return num_removed
+
+    @staticmethod
+    def from_games(games: Iterable[tuple[list[str], float]]) -> MoveTree:
+        """
+        Builds a MoveTree from a whole corpus of (move sequence, win_probability) games in one pass.
+
+        The result is the same as inserting every game, in order, into an empty tree with insert_move_sequence, but
+        the games are sorted first so that games sharing a prefix are next to each other, and each new branch is
+        added where it leaves the previous game. The statistics of every node are then calculated once, bottom up.
+        """
+        games = [game for game in games if len(game[0]) > 0]  # inserting an empty sequence does nothing
+        order = sorted(range(len(games)), key=lambda index: games[index][0])  # stable, so duplicates stay in order
+
+        # the nodes in the order they are created (after their parents), and for each one, by its position in nodes:
+        #   - the position of its parent
+        #   - the index and win_probability of the last game that ended there (-1 if none did), and how many did
+        nodes = [MoveTree(GAME_START_MOVE)]
+        parents = [-1]
+        last_end, end_value, num_ends = [-1], [0.0], [0]
+        path = [0]
+        previous = []
+
+        for index in order:
+            sequence, win_probability = games[index]
+            common = 0
+            limit = min(len(sequence), len(previous))
+            while common < limit and sequence[common] == previous[common]:
+                common += 1
+
+            del path[common + 1:]
+            for move in sequence[common:]:
+                subtree = MoveTree(move)
+                nodes[path[-1]].subtrees[move] = subtree
+                parents.append(path[-1])
+                path.append(len(nodes))
+                nodes.append(subtree)
+                last_end.append(-1)
+                end_value.append(0.0)
+                num_ends.append(0)
+
+            last_end[path[-1]] = index
+            end_value[path[-1]] = win_probability
+            num_ends[path[-1]] += 1
+            previous = sequence
+
+        # the index of the last game that went below each node, the sum of its subtrees' win_probability and its visits
+        last_below = [-1] * len(nodes)
+        subtree_sums = [0.0] * len(nodes)
+        visits = num_ends
+        for i in range(len(nodes) - 1, -1, -1):
+            node = nodes[i]
+            node.visits = visits[i]
+            node.subtree_win_probability_sum = subtree_sums[i]
+            if last_end[i] > last_below[i]:  # the last game to reach this node ended there
+                node.win_probability = end_value[i]
+            elif node.subtrees:
+                node.win_probability = subtree_sums[i] / len(node.subtrees)
+
+            parent = parents[i]
+            if parent >= 0:
+                visits[parent] += visits[i]
+                subtree_sums[parent] += node.win_probability
+                last_below[parent] = max(last_below[parent], last_below[i], last_end[i])
+
+        return nodes[0]
+
+    def save(self, filename: str) -> None:
+        """
+        Saves this tree to a binary file that can be read back with MoveTree.load.
+
+        The file holds a header followed by one flat array per node attribute, with the nodes in breadth first order:
+            - first_child: the index of the node's first subtree (uint32), whose siblings follow it directly
+            - win_probability: the node's win_probability (float32)
+            - visits: the node's visits (uint32)
+            - move: the node's root as an index into COLUMNS, or 255 for GAME_START_MOVE (uint8)
+            - num_children: the number of subtrees of the node (uint8)
+            - num_collapsed: the number of collapsed_moves of the node (uint8)
+        The collapsed_moves of a node are stored as extra nodes with no subtrees and no visits, starting at its
+        first_child, which are not counted in its num_children.
+        """
+        first_child = array('I')
+        win_probabilities = array('f')
+        visits = array('I')
+        moves = bytearray()
+        num_children = bytearray()
+        num_collapsed = bytearray()
+
+        queue = [self]
+        for tree in queue:  # the queue grows while it is iterated over, which gives a breadth first order
+            first_child.append(len(queue))
+            win_probabilities.append(tree.win_probability)
+            visits.append(tree.visits)
+            moves.append(_encode_move(tree.root))
+            num_children.append(len(tree.subtrees))
+            queue.extend(tree.subtrees.values())
+            if tree.collapsed_moves is None:
+                num_collapsed.append(0)
+            else:
+                num_collapsed.append(len(tree.collapsed_moves))
+                queue.extend(MoveTree(move, value) for move, value in tree.collapsed_moves.items())
+
+        if sys.byteorder == 'big':
+            first_child.byteswap()
+            win_probabilities.byteswap()
+            visits.byteswap()
+
+        with open(filename, 'wb') as file:
+            file.write(struct.pack(TREE_FILE_HEADER, TREE_FILE_MAGIC, TREE_FILE_VERSION, 0, len(queue)))
+            file.write(first_child.tobytes())
+            file.write(win_probabilities.tobytes())
+            file.write(visits.tobytes())
+            file.write(moves)
+            file.write(num_children)
+            file.write(num_collapsed)
+
+    @staticmethod
+    def load(filename: str) -> MoveTree:
+        """
+        Loads a tree that was saved with MoveTree.save.
+
+        Raises a ValueError if the file is not a tree file, or was written by an incompatible version.
+        """
+        with open(filename, 'rb') as file:
+            data = file.read()
+
+        num_nodes, version = _read_tree_file_header(data, filename)
+        first_child, win_probabilities, moves, num_children, visits, num_collapsed = \
+            _tree_file_arrays(memoryview(data), num_nodes, version)
+
+        trees = list(map(MoveTree, map(_DECODED_MOVES.__getitem__, moves), win_probabilities.tolist()))
+        for tree, start, count, tree_visits, collapsed in zip(trees, first_child, num_children, visits, num_collapsed):
+            tree.visits = tree_visits
+            if count:
+                tree.subtrees = {child.root: child for child in trees[start:start + count]}
+                tree.subtree_win_probability_sum = sum(win_probabilities[start:start + count])
+            if collapsed:
+                tree.collapsed_moves = {move.root: move.win_probability for move in trees[start:start + collapsed]}
+
+        return trees[0]
+
+
+# The header of a MoveTree file: magic bytes, format version, reserved, number of nodes
+TREE_FILE_HEADER = '<4sHHI'
+TREE_FILE_MAGIC = b'C4MT'
+TREE_FILE_VERSION = 3
+# the size of each node in each readable version of the file format (version 2 has no num_collapsed)
+_TREE_FILE_BYTES_PER_NODE = {2: 14, 3: 15}
+_START_MOVE_CODE = 255
+
+
+def _encode_move(move: str) -> int:
+    """
+    Returns the byte used to store the given move in a MoveTree file.
+    """
+    if move == GAME_START_MOVE:
+        return _START_MOVE_CODE
+    elif move in COLUMNS:
+        return ord(move) - 65
+    else:
+        raise ValueError(f'cannot store move {move!r} in a tree file')
+
+
+# the move stored as each byte in a MoveTree file
+_DECODED_MOVES = {index: column for index, column in enumerate(COLUMNS)}
+_DECODED_MOVES[_START_MOVE_CODE] = GAME_START_MOVE
+
+
+def _read_tree_file_header(data, filename: str) -> tuple[int, int]:
+    """
+    Checks the header of a MoveTree file and returns the number of nodes in the file and its format version.
+    """
+    header_size = struct.calcsize(TREE_FILE_HEADER)
+    if len(data) < header_size:
+        raise ValueError(f'{filename} is not a MoveTree file')
+    magic, version, _, num_nodes = struct.unpack_from(TREE_FILE_HEADER, data)
+    if magic != TREE_FILE_MAGIC:
+        raise ValueError(f'{filename} is not a MoveTree file')
+    if version not in _TREE_FILE_BYTES_PER_NODE:
+        raise ValueError(f'{filename} has version {version}, expected version {TREE_FILE_VERSION}')
+    if len(data) != header_size + num_nodes * _TREE_FILE_BYTES_PER_NODE[version]:
+        raise ValueError(f'{filename} is truncated')
+    return num_nodes, version
+
+
+def _tree_file_arrays(data: memoryview, num_nodes: int, version: int) -> tuple:
+    """
+    Returns the first_child, win_probability, move, num_children, visits and num_collapsed arrays of a MoveTree file.
+    The num_collapsed of a version 2 file are all 0.
+
+    The arrays are views of data, except on big endian machines, where the file has to be copied and converted.
+    """
+    offset = struct.calcsize(TREE_FILE_HEADER)
+    first_child = data[offset:offset + 4 * num_nodes].cast('I')
+    offset += 4 * num_nodes
+    win_probabilities = data[offset:offset + 4 * num_nodes].cast('f')
+    offset += 4 * num_nodes
+    visits = data[offset:offset + 4 * num_nodes].cast('I')
+    offset += 4 * num_nodes
+    moves = data[offset:offset + num_nodes]
+    offset += num_nodes
+    num_children = data[offset:offset + num_nodes]
+    offset += num_nodes
+    if version >= 3:
+        num_collapsed = data[offset:offset + num_nodes]
+    else:
+        num_collapsed = bytes(num_nodes)
+
+    if sys.byteorder == 'big':
+        first_child, win_probabilities, visits = array('I', first_child), array('f', win_probabilities), \
+            array('I', visits)
+        first_child.byteswap()
+        win_probabilities.byteswap()
+        visits.byteswap()
+
+    return first_child, win_probabilities, moves, num_children, visits, num_collapsed
 
-        if move_to_insert not in self.subtrees and index == len(sequence) - 1:  # a leaf not already in the tree
-            self.subtrees[move_to_insert] = MoveTree(move_to_insert, win_probability)
-        elif move_to_insert in self.subtrees and index == len(sequence) - 1:  # a leaf that is already in the tree
-            self.subtrees[move_to_insert].win_probability = win_probability
-        elif move_to_insert not in self.subtrees:  # not a leaf and not already in the tree
-            self.subtrees[move_to_insert] = MoveTree(move_to_insert)
 
-        self.subtrees[move_to_insert]._insert_move_sequence_index(sequence, win_probability, index + 1)
-        self.calculate_win_probability()
+class FrozenMoveTree:
+    """
+    A read-only view of one node of a MoveTree file, which is memory-mapped rather than loaded.
+
+    Supports the same navigation as MoveTree (find_subtree_by_move, is_leaf and subtrees), so it can be used as the
+    past_games of a LearningPlayer that is not learning any more. Since the file is mapped read-only, every process
+    that opens the same file shares a single copy of it through the operating system's page cache.
+
+    Instance Attributes:
+        - root: the move that was played on this turn
+        - win_probability: the win_probability of this node, as in MoveTree
+        - visits: the visits of this node, as in MoveTree
+        - index: the position of this node in the file's node arrays
+    """
+    root: str
+    win_probability: float
+    visits: int
+    index: int
+    _arrays: tuple
+
+    def __init__(self, arrays: tuple, index: int):
+        self._arrays = arrays
+        self.index = index
+        self.root = _DECODED_MOVES[arrays[2][index]]
+        self.win_probability = arrays[1][index]
+        self.visits = arrays[4][index]
+
+    @staticmethod
+    def open(filename: str) -> FrozenMoveTree:
+        """
+        Memory-maps a file saved with MoveTree.save and returns its root.
+
+        Raises a ValueError if the file is not a tree file, or was written by an incompatible version.
+        """
+        with open(filename, 'rb') as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        num_nodes, version = _read_tree_file_header(data, filename)
+        return FrozenMoveTree(_tree_file_arrays(memoryview(data), num_nodes, version), 0)
+
+    @property
+    def subtrees(self) -> dict[str, FrozenMoveTree]:
+        """
+        The possible moves following this move.
+        """
+        start = self._arrays[0][self.index]
+        count = self._arrays[3][self.index]
+        subtrees = {}
+        for child in range(start, start + count):
+            subtree = FrozenMoveTree(self._arrays, child)
+            subtrees[subtree.root] = subtree
+        return subtrees
+
+    def is_empty(self) -> bool:
+        """
+        Returns whether this tree is empty.
+        """
+        return False
+
+    def is_leaf(self) -> bool:
+        """
+        Returns whether this tree is a leaf (has no subtrees).
+        """
+        return self._arrays[3][self.index] == 0
+
+    def find_subtree_by_move(self, move: str) -> Optional[FrozenMoveTree]:
+        """
+        Return the subtree corresponding to the given move.
+
+        Return None is no subtree corresponds to that move.
+        """
+        first_child, _, moves, num_children = self._arrays[:4]
+        start = first_child[self.index]
+        code = _encode_move(move)
+        for child in range(start, start + num_children[self.index]):
+            if moves[child] == code:
+                return FrozenMoveTree(self._arrays, child)
+        return None
 
 
 class LearningPlayer(Player):
@@ -91,18 +529,28 @@ class LearningPlayer(Player):
 
     Instance Attributes:
         - colour: the colour of the pieces this player uses.
-        - past_games: a tree with previous game move sequences.
+        - past_games: a tree with previous game move sequences. A FrozenMoveTree can be used if the player does not
+        need to learn any more, and a position_graph.PositionGraph to share statistics between transpositions.
         - exploration_probability: the likelihood that the player will play a random move (0.0 for always random, 1.0
         for never random)
+        - opening_book: if given, the book moves are played instead of following past_games while the game is in the
+        book
+        - confidence: if given, moves are chosen from past_games by an upper confidence bound instead of by their
+        win_probability alone (see choose_by_confidence), with this as the weight of the confidence term
     """
     colour: str
     past_games: Optional[MoveTree]
     exploration_probability: float
+    opening_book: Optional[OpeningBook]
+    confidence: Optional[float]
 
-    def __init__(self, colour: str, past_games: MoveTree, exploration_probability: float):
+    def __init__(self, colour: str, past_games: MoveTree, exploration_probability: float,
+                 opening_book: Optional[OpeningBook] = None, confidence: Optional[float] = None):
         Player.__init__(self, colour)
         self.past_games = past_games
         self.exploration_probability = exploration_probability
+        self.opening_book = opening_book
+        self.confidence = confidence
 
     def check_for_winning_moves(self, available_columns: list[str], game: GameManager) -> Optional[str]:
         """
@@ -149,6 +597,15 @@ class LearningPlayer(Player):
         if len(game.move_sequence) != 0 and self.past_games is not None:
             last_move = game.move_sequence[-1]
             self.past_games = self.past_games.find_subtree_by_move(last_move)
+            if instrumentation.enabled:
+                instrumentation.record_tree_lookup(self.past_games is not None)
+        if self.past_games is None and instrumentation.enabled:
+            instrumentation.counters.moves_without_tree += 1
+
+        if self.opening_book is not None:
+            book_move = self.opening_book.lookup(game.move_sequence)
+            if book_move is not None and book_move in available_columns:
+                return book_move
 
         if len(game.move_sequence) >= 6:
             winning_move = self.check_for_winning_moves(available_columns, game)
@@ -160,7 +617,9 @@ class LearningPlayer(Player):
 
         if self.past_games is not None and not self.past_games.is_leaf():
             explore = random.uniform(0.0, 1.0)
-            if explore <= self.exploration_probability:
+            if explore <= self.exploration_probability and self.confidence is not None:
+                return self.choose_by_confidence(available_columns)
+            elif explore <= self.exploration_probability:
                 max_win_prob_so_far = -1.0
                 best_subtree = available_columns[0]
                 for subtree in self.past_games.subtrees.values():
@@ -175,34 +634,77 @@ class LearningPlayer(Player):
                 next_move = random.choice(available_columns)
                 if next_move not in self.past_games.subtrees:
                     self.past_games = None
+                    if instrumentation.enabled:
+                        instrumentation.counters.trees_lost += 1
                 return next_move
         else:
             return random.choice(available_columns)
 
-    def insert_games_from_csv(self, filename: str):
+    def choose_by_confidence(self, available_columns: list[str]) -> str:
         """
-        Inserts games from the given csv file into the past_games tree.
+        Returns the available move with the highest upper confidence bound (UCB1) on its win_probability:
+
+            win_probability + confidence * sqrt(ln(total visits of the moves here) / visits of the move)
+
+        A move played in only a few games gets a large bonus, so a single lucky win cannot outweigh a move that has been
+        played thousands of times, and uncertain moves keep being tried until their value is known. Moves that are not
+        in past_games yet are tried first, in random order.
         """
-        with open(filename, newline='') as csvfile:
-            reader = csv.reader(csvfile)
+        subtrees = self.past_games.subtrees
+        unseen = [column for column in available_columns if column not in subtrees or subtrees[column].visits == 0]
+        if unseen:
+            next_move = random.choice(unseen)
+            if next_move not in subtrees:
+                self.past_games = None
+                if instrumentation.enabled:
+                    instrumentation.counters.trees_lost += 1
+            return next_move
+
+        log_visits = math.log(sum(subtrees[column].visits for column in available_columns))
+        best_move, best_bound = available_columns[0], -math.inf
+        for column in available_columns:
+            subtree = subtrees[column]
+            bound = subtree.win_probability + self.confidence * math.sqrt(log_visits / subtree.visits)
+            if bound > best_bound:
+                best_move, best_bound = column, bound
+        return best_move
 
-            for row in reader:
-                move_sequence = row
-                winning_colour = next(reader)
-                if winning_colour[0] == self.colour:
-                    self.past_games.insert_move_sequence(move_sequence, 1.0)
-                else:
-                    self.past_games.insert_move_sequence(move_sequence, -1.0)
+    def insert_games_from_csv(self, filename: str):
+        """
+        Inserts games from the given game record file (see game_records) into the past_games tree.
+        """
+        for move_sequence, winning_colour in read_game_records(filename):
+            if winning_colour == self.colour:
+                self.past_games.insert_move_sequence(move_sequence, 1.0)
+            else:
+                self.past_games.insert_move_sequence(move_sequence, -1.0)
 
 
-def run_learning_algorithm(exploration_probabilities: list[float], past_games: Optional[MoveTree] = None) -> tuple:
+def run_learning_algorithm(exploration_probabilities: list[float], past_games: Optional[MoveTree] = None,
+                           board_type: type = Board, memory_budget: Optional[int] = None,
+                           confidence: Optional[float] = None) -> tuple:
     """
     Plays the specified number of Connect 4 games with the red player learning from each game.
+
+    If confidence is given, the red player chooses its moves by upper confidence bound (see
+    LearningPlayer.choose_by_confidence).
+
+    If instrumentation is enabled, the counters of the games played can be read with instrumentation.stats() afterwards.
+
+    If memory_budget is given, the tree is kept within about that many bytes (estimated with MOVE_TREE_NODE_BYTES):
+    whenever it grows past the budget, it is pruned with MoveTree.prune_to_size down to three quarters of the budget.
+    Only a MoveTree can be pruned, so a ValueError is raised if memory_budget is given with any other past_games.
     """
     if past_games is None:
         game_tree_so_far = MoveTree(GAME_START_MOVE)
     else:
         game_tree_so_far = past_games
+    if memory_budget is not None:
+        if not isinstance(game_tree_so_far, MoveTree):
+            raise ValueError(f'memory_budget needs past_games to be a MoveTree, '
+                             f'not a {type(game_tree_so_far).__name__}')
+        max_tree_size = memory_budget // MOVE_TREE_NODE_BYTES
+        tree_size = game_tree_so_far.size()
     yellow_player = RandomPlayer()
 
     stats = {'red': 0, 'yellow': 0, 'draw': 0}
@@ -211,8 +713,8 @@ def run_learning_algorithm(exploration_probabilities: list[float], past_games: O
     num_games = len(exploration_probabilities)
 
     for i in range(num_games):
-        red_player = LearningPlayer('red', game_tree_so_far, exploration_probabilities[i])
-        game = GameManager(red_player, yellow_player)
+        red_player = LearningPlayer('red', game_tree_so_far, exploration_probabilities[i], confidence=confidence)
+        game = GameManager(red_player, yellow_player, board_type)
         game.run_game()
         winner = game.winner
 
@@ -224,11 +726,16 @@ def run_learning_algorithm(exploration_probabilities: list[float], past_games: O
         move_sequence = game.move_sequence
 
         if winner == 'red':
-            game_tree_so_far.insert_move_sequence(move_sequence, 1.0)
+            num_added = game_tree_so_far.insert_move_sequence(move_sequence, 1.0)
         elif winner == 'yellow':
-            game_tree_so_far.insert_move_sequence(move_sequence, -1.0)
+            num_added = game_tree_so_far.insert_move_sequence(move_sequence, -1.0)
         else:
-            game_tree_so_far.insert_move_sequence(move_sequence, 0.0)
+            num_added = game_tree_so_far.insert_move_sequence(move_sequence, 0.0)
+
+        if memory_budget is not None:
+            tree_size += num_added
+            if tree_size > max_tree_size:
+                tree_size -= game_tree_so_far.prune_to_size(max_tree_size * 3 // 4)
 
     # for stat in stats:
     #     print(f'{stat}: {stats[stat]}')
@@ -269,20 +776,32 @@ def learning_algorithm_example():
     print(f"New: {(new_stats['red'] / 20000) * 100}")
 
 
-def run_learning_algorithm_for_data(probabilities: list[float], filename: str):
+def run_learning_algorithm_for_data(probabilities: list[float], filename: str, board_type: type = Board,
+                                    workers: int = 1, games_per_merge: int = 1000, seed: Optional[int] = None):
     """
-    Runs the learning algorithm and writes the data to a csv file.
+    Runs the learning algorithm and writes the games to a game record file (see game_records).
+
+    If workers is greater than 1, the games are played by a pool of that many processes instead. The schedule of
+    probabilities is played in rounds of games_per_merge games. In each round, every worker plays a contiguous shard of
+    the round against its own copy of the tree as it was at the start of the round, and the results are then merged
+    back into the tree (and written to the csv file) in schedule order, so for a given seed and number of workers the
+    output is always the same. Each worker is sent the tree once, and after that only the games merged in each round.
     """
-    game_tree = MoveTree(GAME_START_MOVE)
-    with open(filename, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
+    if workers > 1:
+        return _run_learning_algorithm_for_data_parallel(probabilities, filename, board_type, workers,
+                                                         games_per_merge, seed)
 
+    if seed is not None:
+        random.seed(seed)
+
+    game_tree = MoveTree(GAME_START_MOVE)
+    with GameRecordWriter(filename) as writer:
         num_wins_by_colour = {'red': 0, 'yellow': 0, 'draw': 0}
 
         for probability in probabilities:
             red_player = LearningPlayer('red', game_tree, probability)
             yellow_player = RandomPlayer()
-            game = GameManager(red_player, yellow_player)
+            game = GameManager(red_player, yellow_player, board_type)
             game.run_game()
             if game.winner == 'red':
                 num_wins_by_colour['red'] += 1
@@ -294,10 +813,103 @@ def run_learning_algorithm_for_data(probabilities: list[float], filename: str):
                 num_wins_by_colour['draw'] += 1
                 game_tree.insert_move_sequence(game.move_sequence, 0.0)
 
-            writer.writerow(game.move_sequence)
-            if game.winner is not None:
-                writer.writerow([game.winner])
-            else:
-                writer.writerow(['draw'])
+            writer.write(game.move_sequence, game.winner)
 
         return num_wins_by_colour
+
+
+# the copy of the tree a worker process of run_learning_algorithm_for_data plays against, set by _init_learning_worker
+_worker_tree = None
+
+
+def _init_learning_worker(game_tree: MoveTree) -> None:
+    """
+    Stores the copy of the tree that a worker process plays against. This is the only time the tree is sent to it.
+    """
+    global _worker_tree
+    _worker_tree = game_tree
+
+
+def _play_learning_shard(merged_games: list[tuple[list[str], str]], probabilities: list[float], board_type: type,
+                         seed: str) -> list[tuple[list[str], str]]:
+    """
+    Brings the worker's copy of the tree up to date by inserting the games merged into the master tree in the previous
+    round, then plays one game for each of the given probabilities against it, in a worker process.
+
+    The shard's own games are not inserted yet, so that the copy stays the same as the master tree once they have been
+    merged. Returns the move sequence and winner of every game.
+    """
+    for move_sequence, winner in merged_games:
+        _worker_tree.insert_move_sequence(move_sequence, WIN_PROBABILITIES[winner])
+
+    random.seed(seed)
+    results = []
+    for probability in probabilities:
+        red_player = LearningPlayer('red', _worker_tree, probability)
+        game = GameManager(red_player, RandomPlayer(), board_type)
+        game.run_game()
+        results.append((game.move_sequence, game.winner))
+
+    return results
+
+
+def _run_learning_algorithm_for_data_parallel(probabilities: list[float], filename: str, board_type: type,
+                                              workers: int, games_per_merge: int,
+                                              seed: Optional[int]) -> dict[str, int]:
+    """
+    The process pool version of run_learning_algorithm_for_data.
+
+    Each worker is a pool of one process, so that the same process plays the same shard of every round and its copy
+    of the tree can be kept up to date with only the games merged since the previous round.
+    """
+    game_tree = MoveTree(GAME_START_MOVE)
+    num_wins_by_colour = {'red': 0, 'yellow': 0, 'draw': 0}
+    shard_size = max(1, -(-games_per_merge // workers))
+    if seed is None:  # unseeded runs must still differ from each other
+        seed = random.randrange(2 ** 63)
+    executors = [ProcessPoolExecutor(max_workers=1, initializer=_init_learning_worker, initargs=(game_tree,))
+                 for _ in range(workers)]
+    merged_games = []
+
+    try:
+        with GameRecordWriter(filename) as writer:
+            for round_start in range(0, len(probabilities), games_per_merge):
+                round_probabilities = probabilities[round_start:round_start + games_per_merge]
+                shards = [round_probabilities[i:i + shard_size]
+                          for i in range(0, len(round_probabilities), shard_size)]
+                futures = [executors[i].submit(_play_learning_shard, merged_games, shard, board_type,
+                                               f'{seed}-{round_start}-{i}') for i, shard in enumerate(shards)]
+
+                merged_games = []
+                for future in futures:  # merge in schedule order, regardless of which shard finished first
+                    for move_sequence, winner in future.result():
+                        num_wins_by_colour[winner] += 1
+                        game_tree.insert_move_sequence(move_sequence, WIN_PROBABILITIES[winner])
+                        writer.write(move_sequence, winner)
+                        merged_games.append((move_sequence, winner))
+    finally:
+        for executor in executors:
+            executor.shutdown(cancel_futures=True)
+
+    return num_wins_by_colour
+
+
+def load_move_tree(csv_filename: str, colour: str = 'red') -> MoveTree:
+    """
+    Returns the tree learned by a LearningPlayer of the given colour from the games in the given csv file.
+
+    The tree is cached next to the csv file in a binary MoveTree file, which is loaded instead of the csv file when it
+    is present and up to date.
+    """
+    tree_filename = os.path.splitext(csv_filename)[0] + f'_{colour}.mtree'
+    if os.path.exists(tree_filename) and os.path.getmtime(tree_filename) >= os.path.getmtime(csv_filename):
+        try:
+            return MoveTree.load(tree_filename)
+        except ValueError:
+            pass  # an old or damaged cache, rebuild it
+
+    # the same values as LearningPlayer.insert_games_from_csv
+    tree = MoveTree.from_games((move_sequence, 1.0 if winner == colour else -1.0)
+                               for move_sequence, winner in read_game_records(csv_filename))
+    tree.save(tree_filename)
+    return tree
@@ -3,8 +3,11 @@ Contains the GameManager class, which plays a game of Connect 4.
 """
 from __future__ import annotations
 from connect4 import *
+from game_records import GameRecordWriter
+from typing import Union
+import instrumentation
 import random
-import csv
+import time
 
 
 class Player:
@@ -45,21 +48,30 @@ class GameManager:
     Instance Attributes:
         - red_player: the player who will play with the red pieces. NOTE: the red player always goes first.
         - yellow_player: the player who will play with the yellow pieces.
-        - board: the board that this game is played on.
+        - board: the board that this game is played on. Either a Board or a BitBoard.
         - move_sequence: a list of all the moves played during the game.
         - winner: the colour of the player who won the game.
+        - player_names: the name of the player of each colour, which their move latencies are recorded under when
+        instrumentation is enabled. If not given, the names of the players' types are used.
     """
     red_player: Player
     yellow_player: Player
-    board: Board
+    board: Union[Board, BitBoard]
     moves_per_column: dict[str, int]
     move_sequence: list[str]
     winner: Optional[str] = None
+    player_names: dict[str, str]
 
-    def __init__(self, red_player: Player, yellow_player: Player):
+    def __init__(self, red_player: Player, yellow_player: Player, board_type: type = Board,
+                 player_names: Optional[dict[str, str]] = None):
         self.red_player = red_player
         self.yellow_player = yellow_player
-        self.board = Board()
+        if player_names is None:
+            player_names = {'red': type(red_player).__name__, 'yellow': type(yellow_player).__name__}
+        self.player_names = player_names
+        if instrumentation.enabled:
+            board_type = instrumentation.counting_board_type(board_type)
+        self.board = board_type()
         self.moves_per_column = {}
         for column in COLUMNS:
             self.moves_per_column[column] = 0
@@ -77,22 +89,28 @@ class GameManager:
         Runs a game between red_player and yellow_player.
         """
         available_columns = ['A', 'B', 'C', 'D', 'E', 'F', 'G']
+        instrumented = instrumentation.enabled
+        if instrumented:
+            instrumentation.counters.games += 1
 
         while not self.board.full_board():
             if len(self.move_sequence) % 2 == 0:
-                moving_player = 'red'
-                move = self.red_player.make_move(available_columns, self)
-                self.board.add_piece('red', move)
+                moving_player, player = 'red', self.red_player
             else:
-                moving_player = 'yellow'
-                move = self.yellow_player.make_move(available_columns, self)
-                self.board.add_piece('yellow', move)
+                moving_player, player = 'yellow', self.yellow_player
+            if instrumented:
+                start = time.perf_counter()
+                move = player.make_move(available_columns, self)
+                instrumentation.record_move_latency(self.player_names[moving_player], time.perf_counter() - start)
+            else:
+                move = player.make_move(available_columns, self)
+            self.board.add_piece(moving_player, move)
             self.move_sequence.append(move)
             # print(f'{moving_player.upper()} plays {move}')
             self.moves_per_column[move] += 1
-            if self.moves_per_column[move] >= 6:
+            if not self.board.is_playable(move):
                 available_columns.remove(move)
-            if self.board.check_win((move, self.moves_per_column[move])):
+            if self.board.check_win((move, self.board.heights[move])):
                 self.winner = moving_player
                 # print(f'{moving_player.upper()} wins!')
                 return
@@ -100,16 +118,18 @@ class GameManager:
         self.winner = 'draw'
 
 
-def run_games_random(num_games: int) -> dict[str, int]:
+def run_games_random(num_games: int, board_type: type = Board) -> dict[str, int]:
     """
     Runs the specified number of games between two RandomPlayers.
+
+    board_type is the board implementation used for every game, either Board or BitBoard.
     """
     num_wins_by_colour = {'red': 0, 'yellow': 0, 'draw': 0}
 
     for _ in range(num_games):
         red_player = RandomPlayer()
         yellow_player = RandomPlayer()
-        game = GameManager(red_player, yellow_player)
+        game = GameManager(red_player, yellow_player, board_type)
         game.run_game()
         if game.winner == 'red':
             num_wins_by_colour['red'] += 1
@@ -121,20 +141,18 @@ def run_games_random(num_games: int) -> dict[str, int]:
     return num_wins_by_colour
 
 
-def run_games_random_for_data(num_games: int, filename: str) -> dict[str, int]:
+def run_games_random_for_data(num_games: int, filename: str, board_type: type = Board) -> dict[str, int]:
     """
     Runs the specified number of games between two RandomPlayers, and saves the move sequence and winner of each game
-    in a CSV file.
+    in a game record file (see game_records).
     """
-    with open(filename, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-
+    with GameRecordWriter(filename) as writer:
         num_wins_by_colour = {'red': 0, 'yellow': 0, 'draw': 0}
 
         for _ in range(num_games):
             red_player = RandomPlayer()
             yellow_player = RandomPlayer()
-            game = GameManager(red_player, yellow_player)
+            game = GameManager(red_player, yellow_player, board_type)
             game.run_game()
             if game.winner == 'red':
                 num_wins_by_colour['red'] += 1
@@ -143,10 +161,6 @@ def run_games_random_for_data(num_games: int, filename: str) -> dict[str, int]:
             else:
                 num_wins_by_colour['draw'] += 1
 
-            writer.writerow(game.move_sequence)
-            if game.winner is not None:
-                writer.writerow([game.winner])
-            else:
-                writer.writerow(['draw'])
+            writer.write(game.move_sequence, game.winner)
 
         return num_wins_by_colour
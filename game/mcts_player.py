@@ -0,0 +1,290 @@
+"""
+Implements a player that chooses its moves with Monte Carlo Tree Search (UCT).
+
+Random playouts are run on bitboards, using the same position representation as search_player.
+"""
+from __future__ import annotations
+from manager import *
+from search_player import position_from_moves, can_play, is_winning_move, play
+from concurrent.futures import ProcessPoolExecutor
+import threading
+import math
+import random
+import time
+
+
+class _MCTSNode:
+    """
+    A position in a Monte Carlo search tree.
+
+    Instance Attributes:
+        - current, mask: the bitboards of this position, as in search_player
+        - ply: the number of moves played to reach this position
+        - children: the positions that have been expanded from this one, by column index
+        - untried: the legal columns that have not been expanded yet
+        - visits: the number of playouts that went through this position
+        - wins: the total reward of those playouts for the player who moved into this position (1 for a win, 0.5 for a
+        draw, 0 for a loss)
+        - winner: if the game is over in this position, 0 if red won, 1 if yellow won, 2 for a draw, otherwise None
+    """
+    current: int
+    mask: int
+    ply: int
+    children: dict[int, _MCTSNode]
+    untried: list[int]
+    visits: int
+    wins: float
+    winner: Optional[int]
+
+    def __init__(self, current: int, mask: int, ply: int, winner: Optional[int] = None):
+        self.current = current
+        self.mask = mask
+        self.ply = ply
+        self.children = {}
+        self.visits = 0
+        self.wins = 0.0
+        self.winner = winner
+        if winner is None:
+            self.untried = [column for column in range(7) if can_play(mask, column)]
+        else:
+            self.untried = []
+
+    def expand(self, column: int) -> _MCTSNode:
+        """
+        Adds the position reached by playing the given column as a child of this position, and returns it.
+        """
+        self.untried.remove(column)
+        winner = None
+        if is_winning_move(self.current, self.mask, column):
+            winner = self.ply % 2
+        elif self.ply == 41:
+            winner = 2
+        child = _MCTSNode(*play(self.current, self.mask, column), self.ply + 1, winner)
+        self.children[column] = child
+        return child
+
+    def select_child(self, exploration: float) -> _MCTSNode:
+        """
+        Returns the child with the highest upper confidence bound (UCB1).
+        """
+        log_visits = math.log(self.visits)
+        best_child, best_score = None, -1.0
+        for child in self.children.values():
+            score = child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if score > best_score:
+                best_child, best_score = child, score
+        return best_child
+
+
+def _reward(winner: int, ply: int) -> float:
+    """
+    Returns the reward of a game result for the player who made move number ply (counting from 1).
+    """
+    if winner == 2:
+        return 0.5
+    elif winner == (ply - 1) % 2:
+        return 1.0
+    else:
+        return 0.0
+
+
+class MCTSPlayer(Player):
+    """
+    A player that chooses its moves with Monte Carlo Tree Search.
+
+    Each move runs as many iterations as fit in the time budget (or exactly iterations, if given), and plays the most
+    visited move. The part of the search tree below the moves that were actually played is kept between moves.
+
+    If workers is greater than 1, each move is searched with root parallelism instead: every worker process runs its
+    own independent search of the position (with iterations or the time budget each), and the visit counts of the root
+    moves are added up. The workers' seeds are drawn from rng, so for a given seed and number of iterations the moves
+    played are always the same. Search trees are not kept between moves in this mode. Call close() to shut the worker
+    processes down.
+
+    The player can also ponder on the opponent's time, growing the tree of the position the opponent is to move in.
+    When the opponent's move has already had as many playouts as the last move's search ran, it is played straight away.
+    Pondering stops once that position has had ponder_iterations playouts, so that the tree cannot grow without limit
+    if the opponent takes a long time.
+
+    Instance Attributes:
+        - colour: the colour of the pieces this player uses.
+        - time_budget: the number of seconds the player may spend on each move, if iterations is None
+        - iterations: the number of iterations to run for each move, or None to use the time budget
+        - exploration: the exploration constant of the UCB1 formula
+        - rng: the random number generator used for the playouts
+        - workers: the number of processes that search each move
+        - ponder_iterations: the most playouts pondering runs from the position the opponent is to move in
+    """
+    colour: str
+    time_budget: float
+    iterations: Optional[int]
+    exploration: float
+    rng: random.Random
+    workers: int
+    ponder_iterations: int
+    _root: Optional[_MCTSNode]
+    _root_sequence: list[str]
+    _executor: Optional[ProcessPoolExecutor]
+    _search_visits: Optional[int]
+
+    def __init__(self, colour: Optional[str] = None, time_budget: float = 0.1, iterations: Optional[int] = None,
+                 exploration: float = math.sqrt(2), seed: Optional[int] = None, workers: int = 1,
+                 ponder_iterations: int = 100000):
+        Player.__init__(self, colour)
+        self.time_budget = time_budget
+        self.iterations = iterations
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+        self.workers = workers
+        self.ponder_iterations = ponder_iterations
+        self._root = None
+        self._root_sequence = []
+        self._executor = None
+        self._search_visits = None
+
+    def make_move(self, available_columns: list[str], game: GameManager) -> str:
+        """
+        Chooses the most visited move after searching from the current position.
+        """
+        if self.workers > 1:
+            return COLUMNS[self._root_parallel_search(game.move_sequence)]
+
+        root = self._find_root(game.move_sequence)
+        if not root.children or self._search_visits is None or root.visits < self._search_visits:
+            if self.iterations is not None:
+                self.search(root, self.iterations)
+            else:
+                self.search(root, deadline=time.perf_counter() + self.time_budget)
+            if not root.children:  # the time budget was too small for even one iteration
+                self.search(root, 1)
+            self._search_visits = root.visits
+
+        column = max(root.children, key=lambda child: root.children[child].visits)
+        self._root = root.children[column]
+        self._root_sequence = game.move_sequence + [COLUMNS[column]]
+        return COLUMNS[column]
+
+    def ponder(self, move_sequence: list[str], stop: threading.Event) -> None:
+        """
+        Keeps searching the position after move_sequence, where the opponent is to move, until stop is set or the
+        position has had ponder_iterations playouts.
+
+        The opponent's most promising replies get the most playouts, and the tree is kept for make_move. This does
+        nothing when searching with root parallelism, since trees are not kept between moves then. It must not run
+        while make_move does.
+        """
+        if self.workers > 1:
+            return
+        root = self._find_root(move_sequence)
+        while root.winner is None and not stop.is_set() and root.visits < self.ponder_iterations:
+            self.search(root, min(64, self.ponder_iterations - root.visits))
+
+    def close(self) -> None:
+        """
+        Shuts down the worker processes, if there are any.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def _root_parallel_search(self, move_sequence: list[str]) -> int:
+        """
+        Searches the position after the given moves in every worker process, and returns the column with the most
+        visits in total.
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        # time.time is used for the deadline since, unlike time.perf_counter, it is the same in every process
+        deadline = None if self.iterations is not None else time.time() + self.time_budget
+        futures = [self._executor.submit(_search_root_visits, move_sequence, self.iterations, deadline,
+                                         self.exploration, self.rng.randrange(2 ** 32)) for _ in range(self.workers)]
+
+        visits = [0] * 7
+        for future in futures:
+            for column, column_visits in enumerate(future.result()):
+                visits[column] += column_visits
+        return max(range(7), key=visits.__getitem__)  # every worker visits at least one legal column
+
+    def _find_root(self, move_sequence: list[str]) -> _MCTSNode:
+        """
+        Returns the search tree of the position after the given moves, reusing the previous tree if possible.
+        """
+        root = self._root
+        if root is not None and move_sequence[:len(self._root_sequence)] == self._root_sequence:
+            for move in move_sequence[len(self._root_sequence):]:
+                root = root.children.get(ord(move) - 65)
+                if root is None:
+                    break
+        else:
+            root = None
+
+        if root is None:
+            root = _MCTSNode(*position_from_moves(move_sequence), len(move_sequence))
+        self._root = root
+        self._root_sequence = list(move_sequence)
+        return root
+
+    def search(self, root: _MCTSNode, iterations: Optional[int] = None, deadline: Optional[float] = None) -> None:
+        """
+        Runs iterations of the search from root, until either the given number of iterations has been run or the
+        deadline (from time.perf_counter) has passed.
+        """
+        count = 0
+        while (iterations is None or count < iterations) and (deadline is None or time.perf_counter() < deadline):
+            self._iterate(root)
+            count += 1
+
+    def _iterate(self, root: _MCTSNode) -> None:
+        """
+        Runs a single iteration: selection, expansion, a random playout and backpropagation.
+        """
+        node = root
+        path = [node]
+        while not node.untried and node.children:
+            node = node.select_child(self.exploration)
+            path.append(node)
+
+        if node.untried:
+            node = node.expand(self.rng.choice(node.untried))
+            path.append(node)
+
+        if node.winner is not None:
+            winner = node.winner
+        else:
+            winner = self._playout(node.current, node.mask, node.ply)
+
+        for visited in path:
+            visited.visits += 1
+            visited.wins += _reward(winner, visited.ply)
+
+    def _playout(self, current: int, mask: int, ply: int) -> int:
+        """
+        Plays random moves from the given position until the game ends, and returns the winner (as in _MCTSNode).
+        """
+        choice = self.rng.choice
+        while True:
+            column = choice([column for column in range(7) if can_play(mask, column)])
+            if is_winning_move(current, mask, column):
+                return ply % 2
+            if ply == 41:
+                return 2
+            current, mask = play(current, mask, column)
+            ply += 1
+
+
+def _search_root_visits(move_sequence: list[str], iterations: Optional[int], deadline: Optional[float],
+                        exploration: float, seed: int) -> list[int]:
+    """
+    Runs an independent search of the position after the given moves in a worker process, and returns the number of
+    visits of each column at the root.
+    """
+    player = MCTSPlayer(iterations=iterations, exploration=exploration, seed=seed)
+    root = _MCTSNode(*position_from_moves(move_sequence), len(move_sequence))
+    if deadline is None:
+        player.search(root, iterations)
+    else:
+        player.search(root, deadline=time.perf_counter() + (deadline - time.time()))
+    if not root.children:
+        player.search(root, 1)
+    return [root.children[column].visits if column in root.children else 0 for column in range(7)]
@@ -0,0 +1,174 @@
+"""
+An opening book: the best move in every early position, computed ahead of time with a deep search.
+
+The book is built offline with build_opening_book and stored in a compact binary file, which players load at start-up
+and check before falling back to searching or to their MoveTree.
+"""
+from __future__ import annotations
+from typing import Optional
+from array import array
+from bisect import bisect_left
+from position_graph import mirror_bits
+from search_player import SearchPlayer, position_from_moves, can_play, is_winning_move, play
+from connect4 import COLUMNS
+import argparse
+import struct
+import sys
+
+# The header of an opening book file: magic bytes, format version, maximum ply, number of positions
+BOOK_FILE_HEADER = '<4sHHQ'
+BOOK_FILE_MAGIC = b'C4OB'
+BOOK_FILE_VERSION = 1
+
+
+def book_key(current: int, mask: int) -> tuple[int, bool]:
+    """
+    Returns the key a position is stored under, and whether the position is stored mirrored.
+
+    A position and its mirror image are stored once, under the smaller of their two keys.
+    """
+    # current + mask has one extra bit above each column's pieces, so each column's bits stay within the column
+    key = current + mask
+    mirrored_key = mirror_bits(key)
+    if mirrored_key < key:
+        return mirrored_key, True
+    return key, False
+
+
+class OpeningBook:
+    """
+    A read-only opening book.
+
+    Instance Attributes:
+        - max_ply: the book holds every position with fewer than this many moves played
+        - keys: the sorted keys of the positions in the book
+        - moves: the best move of each position, as a column index
+        - scores: the search score of each position for the player to move
+    """
+    max_ply: int
+    keys: array
+    moves: bytes
+    scores: array
+
+    def __init__(self, max_ply: int, keys: array, moves: bytes, scores: array):
+        self.max_ply = max_ply
+        self.keys = keys
+        self.moves = moves
+        self.scores = scores
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @staticmethod
+    def load(filename: str) -> OpeningBook:
+        """
+        Loads an opening book saved with OpeningBook.save.
+
+        Raises a ValueError if the file is not an opening book, or was written by an incompatible version.
+        """
+        with open(filename, 'rb') as file:
+            data = file.read()
+
+        header_size = struct.calcsize(BOOK_FILE_HEADER)
+        if len(data) < header_size:
+            raise ValueError(f'{filename} is not an opening book')
+        magic, version, max_ply, count = struct.unpack_from(BOOK_FILE_HEADER, data)
+        if magic != BOOK_FILE_MAGIC:
+            raise ValueError(f'{filename} is not an opening book')
+        if version != BOOK_FILE_VERSION:
+            raise ValueError(f'{filename} has version {version}, expected version {BOOK_FILE_VERSION}')
+        if len(data) != header_size + 11 * count:
+            raise ValueError(f'{filename} is truncated')
+
+        keys = array('Q', data[header_size:header_size + 8 * count])
+        moves = data[header_size + 8 * count:header_size + 9 * count]
+        scores = array('h', data[header_size + 9 * count:])
+        if sys.byteorder == 'big':
+            keys.byteswap()
+            scores.byteswap()
+        return OpeningBook(max_ply, keys, moves, scores)
+
+    def save(self, filename: str) -> None:
+        """
+        Saves this book to a binary file: a header, then the sorted uint64 keys, the uint8 moves and the int16 scores.
+        """
+        keys, scores = array('Q', self.keys), array('h', self.scores)
+        if sys.byteorder == 'big':
+            keys.byteswap()
+            scores.byteswap()
+
+        with open(filename, 'wb') as file:
+            file.write(struct.pack(BOOK_FILE_HEADER, BOOK_FILE_MAGIC, BOOK_FILE_VERSION, self.max_ply, len(keys)))
+            file.write(keys.tobytes())
+            file.write(self.moves)
+            file.write(scores.tobytes())
+
+    def probe(self, current: int, mask: int) -> Optional[tuple[int, int]]:
+        """
+        Returns the (best column, score) of the given position, or None if the position is not in the book.
+        """
+        key, mirrored = book_key(current, mask)
+        index = bisect_left(self.keys, key)
+        if index == len(self.keys) or self.keys[index] != key:
+            return None
+        column = self.moves[index]
+        if mirrored:
+            column = 6 - column
+        return column, self.scores[index]
+
+    def lookup(self, move_sequence: list[str]) -> Optional[str]:
+        """
+        Returns the best move after the given moves, or None if the position is not in the book.
+        """
+        if len(move_sequence) >= self.max_ply:
+            return None
+        entry = self.probe(*position_from_moves(move_sequence))
+        if entry is None:
+            return None
+        return COLUMNS[entry[0]]
+
+
+def build_opening_book(max_ply: int = 8, search_depth: int = 10, table_size_mb: float = 64,
+                       verbose: bool = False) -> OpeningBook:
+    """
+    Searches every position with fewer than max_ply moves played to the given depth, and returns the results as an
+    opening book.
+
+    Positions where the game is already over are left out.
+    """
+    searcher = SearchPlayer(max_depth=search_depth, table_size_mb=table_size_mb)
+    results = {}
+    positions = [(0, 0)]
+
+    for ply in range(max_ply):
+        next_positions = []
+        for current, mask in positions:
+            key, mirrored = book_key(current, mask)
+            if key in results:
+                continue
+            score, column = searcher.search(current, mask, ply, search_depth)
+            results[key] = (6 - column if mirrored else column, score)
+
+            for next_column in range(7):
+                if can_play(mask, next_column) and not is_winning_move(current, mask, next_column):
+                    next_positions.append(play(current, mask, next_column))
+        positions = next_positions
+        if verbose:
+            print(f'Ply {ply}: {len(results)} positions')
+
+    keys = array('Q', sorted(results))
+    moves = bytes(results[key][0] for key in keys)
+    scores = array('h', (results[key][1] for key in keys))
+    return OpeningBook(max_ply, keys, moves, scores)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Builds an opening book.')
+    parser.add_argument('filename')
+    parser.add_argument('--ply', type=int, default=8, help='the book holds every position with fewer moves played')
+    parser.add_argument('--depth', type=int, default=10, help='the search depth used for each position')
+    parser.add_argument('--table-size-mb', type=float, default=64)
+    args = parser.parse_args()
+
+    book = build_opening_book(args.ply, args.depth, args.table_size_mb, verbose=True)
+    book.save(args.filename)
@@ -0,0 +1,200 @@
+"""
+A transposition-aware alternative to MoveTree.
+
+MoveTree keeps a separate node for every move order, even when different move orders reach the same position. The
+PositionGraph stores statistics per position instead, keyed by the position's bitboards, so transpositions share one
+entry. A position and its left-right mirror image are also stored as one entry, since they are equally good.
+"""
+from __future__ import annotations
+from typing import Optional
+from connect4 import COLUMNS, BIT_COLUMN_HEIGHT
+from learning_player import GAME_START_MOVE
+
+_COLUMN_MASK = (1 << BIT_COLUMN_HEIGHT) - 1
+# the red pieces use the low bits of a position key, and the yellow pieces the bits above them
+_YELLOW_SHIFT = 7 * BIT_COLUMN_HEIGHT
+
+
+def mirror_bits(bits: int) -> int:
+    """
+    Returns the bitboard of the given bitboard reflected left to right.
+    """
+    mirrored = 0
+    for column in range(7):
+        mirrored |= ((bits >> (column * BIT_COLUMN_HEIGHT)) & _COLUMN_MASK) << ((6 - column) * BIT_COLUMN_HEIGHT)
+    return mirrored
+
+
+def position_key(red: int, yellow: int) -> int:
+    """
+    Returns the key of the position with the given red and yellow bitboards.
+
+    A position and its mirror image have the same key.
+    """
+    key = red | (yellow << _YELLOW_SHIFT)
+    mirrored_key = mirror_bits(red) | (mirror_bits(yellow) << _YELLOW_SHIFT)
+    return min(key, mirrored_key)
+
+
+class PositionNode:
+    """
+    A position in a PositionGraph, reached by a particular sequence of moves.
+
+    Supports the same navigation as MoveTree (find_subtree_by_move, is_leaf and subtrees), so it can be used as the
+    past_games of a LearningPlayer.
+
+    Instance Attributes:
+        - graph: the graph this position belongs to
+        - root: the move that was played to reach this position
+        - red, yellow: the bitboards of the red and yellow pieces in this position
+        - heights: the number of pieces in each column
+        - win_probability: the average result of the games that reached this position, from -1.0 to 1.0
+        - visits: the number of games that reached this position
+    """
+    graph: PositionGraph
+    root: str
+    red: int
+    yellow: int
+    heights: tuple[int, ...]
+    win_probability: float
+    visits: int
+
+    def __init__(self, graph: PositionGraph, root: str, red: int, yellow: int, heights: tuple[int, ...]):
+        self.graph = graph
+        self.root = root
+        self.red = red
+        self.yellow = yellow
+        self.heights = heights
+        stats = graph.positions.get(position_key(red, yellow))
+        if stats is None:
+            self.win_probability, self.visits = 0.0, 0
+        else:
+            self.win_probability, self.visits = stats[0] / stats[1], stats[1]
+
+    def is_empty(self) -> bool:
+        """
+        Returns whether this position has never been reached.
+        """
+        return self.visits == 0
+
+    def is_leaf(self) -> bool:
+        """
+        Returns whether no position following this one has been reached.
+        """
+        return all(self.find_subtree_by_move(column) is None for column in COLUMNS)
+
+    @property
+    def subtrees(self) -> dict[str, PositionNode]:
+        """
+        The positions that have been reached from this position, by the move that reaches them.
+        """
+        subtrees = {}
+        for column in COLUMNS:
+            subtree = self.find_subtree_by_move(column)
+            if subtree is not None:
+                subtrees[column] = subtree
+        return subtrees
+
+    def find_subtree_by_move(self, move: str) -> Optional[PositionNode]:
+        """
+        Return the position reached by playing the given move.
+
+        Return None if that position has never been reached.
+        """
+        column = ord(move) - 65
+        height = self.heights[column]
+        if height >= 6:
+            return None
+
+        bit = 1 << (column * BIT_COLUMN_HEIGHT + height)
+        red, yellow = self.red, self.yellow
+        if sum(self.heights) % 2 == 0:
+            red |= bit
+        else:
+            yellow |= bit
+        if position_key(red, yellow) not in self.graph.positions:
+            return None
+
+        heights = self.heights[:column] + (height + 1,) + self.heights[column + 1:]
+        return PositionNode(self.graph, move, red, yellow, heights)
+
+
+class PositionGraph:
+    """
+    Statistics of past games, stored per position rather than per move sequence.
+
+    The graph can be used wherever a LearningPlayer expects its past_games tree, in which case it behaves like the
+    starting position. Unlike MoveTree, the win_probability of a position is the average result of every game that
+    reached it, whatever order the moves were played in.
+
+    Instance Attributes:
+        - positions: the [sum of results, number of games] of every position that has been reached, by position key
+    """
+    positions: dict[int, list]
+
+    def __init__(self):
+        self.positions = {}
+
+    def root_node(self) -> PositionNode:
+        """
+        Returns the starting position.
+        """
+        return PositionNode(self, GAME_START_MOVE, 0, 0, (0,) * 7)
+
+    def is_empty(self) -> bool:
+        """
+        Returns whether no games have been inserted into this graph.
+        """
+        return len(self.positions) == 0
+
+    def is_leaf(self) -> bool:
+        """
+        Returns whether no position after the first move has been reached.
+        """
+        return self.root_node().is_leaf()
+
+    @property
+    def subtrees(self) -> dict[str, PositionNode]:
+        """
+        The positions that have been reached after the first move, by that move.
+        """
+        return self.root_node().subtrees
+
+    def find_subtree_by_move(self, move: str) -> Optional[PositionNode]:
+        """
+        Return the position reached by playing the given move first.
+
+        Return None if that position has never been reached.
+        """
+        return self.root_node().find_subtree_by_move(move)
+
+    def insert_move_sequence(self, sequence: list[str], win_probability: float):
+        """
+        Adds the result of the game with the given sequence of moves to every position the game reached.
+        """
+        if len(sequence) == 0:
+            return
+
+        # the pieces of both colours are kept as a single key, along with the key of the mirrored position
+        key = mirrored_key = 0
+        heights = [0] * 7
+        self._add_result(0, win_probability)
+
+        for turn, move in enumerate(sequence):
+            column = ord(move) - 65
+            shift = heights[column] + (_YELLOW_SHIFT if turn % 2 else 0)
+            key |= 1 << (column * BIT_COLUMN_HEIGHT + shift)
+            mirrored_key |= 1 << ((6 - column) * BIT_COLUMN_HEIGHT + shift)
+            heights[column] += 1
+            self._add_result(min(key, mirrored_key), win_probability)
+
+    def _add_result(self, key: int, win_probability: float):
+        """
+        Adds a game result to the position with the given key.
+        """
+        stats = self.positions.get(key)
+        if stats is None:
+            self.positions[key] = [win_probability, 1]
+        else:
+            stats[0] += win_probability
+            stats[1] += 1
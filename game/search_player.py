@@ -0,0 +1,298 @@
+"""
+Implements a player that searches ahead for the best move, using negamax with alpha-beta pruning.
+
+Positions are represented as a pair of bitboards, using the same bit layout as connect4.BitBoard:
+    - current: the pieces of the player whose turn it is
+    - mask: the pieces of both players
+"""
+from __future__ import annotations
+from manager import *
+from transposition_table import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND, NO_MOVE
+from typing import TYPE_CHECKING
+import threading
+import time
+
+if TYPE_CHECKING:
+    from opening_book import OpeningBook
+
+# columns in the order they are searched, since moves near the centre are usually the best ones
+CENTRE_FIRST_ORDER = [3, 2, 4, 1, 5, 0, 6]
+# the score of a position where the player to move wins, minus the number of moves played when they win
+WIN_SCORE = 1000
+_COLUMN_MASKS = [((1 << 6) - 1) << (column * BIT_COLUMN_HEIGHT) for column in range(7)]
+_BOTTOM_MASKS = [1 << (column * BIT_COLUMN_HEIGHT) for column in range(7)]
+_TOP_MASKS = [1 << (5 + column * BIT_COLUMN_HEIGHT) for column in range(7)]
+
+
+class _SearchTimeout(Exception):
+    """
+    Raised when a search runs out of time.
+    """
+
+
+def position_from_moves(move_sequence: list[str]) -> tuple[int, int]:
+    """
+    Returns the (current, mask) bitboards of the position reached by the given moves.
+    """
+    current = mask = 0
+    for move in move_sequence:
+        column = ord(move) - 65
+        current ^= mask
+        mask |= mask + _BOTTOM_MASKS[column]
+    return current, mask
+
+
+def can_play(mask: int, column: int) -> bool:
+    """
+    Returns whether a piece can be dropped into the given column.
+    """
+    return mask & _TOP_MASKS[column] == 0
+
+
+def play(current: int, mask: int, column: int) -> tuple[int, int]:
+    """
+    Returns the (current, mask) bitboards after the player to move drops a piece into the given column.
+    """
+    return current ^ mask, mask | (mask + _BOTTOM_MASKS[column])
+
+
+def is_winning_move(current: int, mask: int, column: int) -> bool:
+    """
+    Returns whether dropping a piece into the given column wins the game for the player to move.
+    """
+    return has_alignment(current | ((mask + _BOTTOM_MASKS[column]) & _COLUMN_MASKS[column]))
+
+
+def winning_spots(pieces: int, mask: int) -> int:
+    """
+    Returns the empty spots that would complete four in a row for the given pieces.
+    """
+    # vertical
+    spots = (pieces << 1) & (pieces << 2) & (pieces << 3)
+    # horizontal and both diagonals
+    for shift in (BIT_COLUMN_HEIGHT, BIT_COLUMN_HEIGHT - 1, BIT_COLUMN_HEIGHT + 1):
+        pair = (pieces << shift) & (pieces << (2 * shift))
+        spots |= pair & (pieces << (3 * shift))
+        spots |= pair & (pieces >> shift)
+        pair = (pieces >> shift) & (pieces >> (2 * shift))
+        spots |= pair & (pieces << shift)
+        spots |= pair & (pieces >> (3 * shift))
+    return spots & (BOARD_MASK ^ mask)
+
+
+def evaluate(current: int, mask: int) -> int:
+    """
+    Returns a heuristic score of a position for the player to move, much smaller than any win or loss score.
+
+    The score is the difference between both players' number of spots that would complete four in a row.
+    """
+    opponent = current ^ mask
+    return bin(winning_spots(current, mask)).count('1') - bin(winning_spots(opponent, mask)).count('1')
+
+
+class SearchPlayer(Player):
+    """
+    A player that chooses its moves with an alpha-beta negamax search.
+
+    The search is run with iterative deepening, one ply deeper each time, until the time budget for the move runs out.
+    The move found by the deepest completed search is played.
+
+    Instance Attributes:
+        - colour: the colour of the pieces this player uses.
+        - time_budget: the number of seconds the player may spend on each move
+        - max_depth: the deepest search that will be run, in plies
+        - nodes: the number of positions visited while choosing the last move
+        - depth: the depth of the deepest completed search for the last move
+        - table: the transposition table shared by every search this player runs
+        - opening_book: if given, the book moves are played instead of searching while the game is in the book
+        - pondered: the replies found by ponder, as (column, depth searched, whether the result of the game is known),
+        by the move sequence they reply to
+    """
+    colour: str
+    time_budget: float
+    max_depth: int
+    nodes: int
+    depth: int
+    table: TranspositionTable
+    opening_book: Optional[OpeningBook]
+    pondered: dict[tuple[str, ...], tuple[int, int, bool]]
+    _deadline: Optional[float]
+    _stop: Optional[threading.Event]
+
+    def __init__(self, colour: Optional[str] = None, time_budget: float = 0.1, max_depth: int = 42,
+                 table_size_mb: float = 16, opening_book: Optional[OpeningBook] = None):
+        Player.__init__(self, colour)
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.nodes = 0
+        self.depth = 0
+        self.table = TranspositionTable(table_size_mb)
+        self.opening_book = opening_book
+        self.pondered = {}
+        self._deadline = None
+        self._stop = None
+
+    def make_move(self, available_columns: list[str], game: GameManager) -> str:
+        """
+        Chooses the best move found within the time budget.
+
+        If ponder already searched this position at least as deep as the last move was searched, its reply is played
+        straight away. Otherwise the search carries on from the depth ponder reached.
+        """
+        if self.opening_book is not None:
+            book_move = self.opening_book.lookup(game.move_sequence)
+            if book_move is not None:
+                return book_move
+
+        current, mask = position_from_moves(game.move_sequence)
+        moves = len(game.move_sequence)
+        best_column, depth, solved = self.pondered.get(tuple(game.move_sequence), (None, 0, False))
+        self.pondered = {}
+        if best_column is not None and (solved or depth >= self.depth):
+            self.nodes = 0
+            self.depth = depth
+            return COLUMNS[best_column]
+
+        self.nodes = 0
+        self._deadline = time.perf_counter() + self.time_budget
+        best_column, self.depth, _ = self._deepen(current, mask, moves, best_column, depth)
+        self._deadline = None
+        if best_column is None:  # not even the shallowest search finished, so play the first legal move in order
+            best_column = next(column for column in CENTRE_FIRST_ORDER if can_play(mask, column))
+        return COLUMNS[best_column]
+
+    def ponder(self, move_sequence: list[str], stop: threading.Event) -> None:
+        """
+        Searches a reply to every move the opponent can make after move_sequence, until stop is set.
+
+        The replies are deepened one ply at a time in turn, so they all get a similar share of the time, and each
+        result is stored in pondered as soon as its search finishes. This must not run while make_move does.
+        """
+        self.pondered = {}
+        current, mask = position_from_moves(move_sequence)
+        moves = len(move_sequence) + 1
+        replies = {}
+        for column in CENTRE_FIRST_ORDER:
+            if moves < 42 and can_play(mask, column) and not is_winning_move(current, mask, column):
+                sequence = tuple(move_sequence) + (COLUMNS[column],)
+                if self.opening_book is None or self.opening_book.lookup(list(sequence)) is None:
+                    replies[sequence] = play(current, mask, column)
+
+        self._stop = stop
+        try:
+            while replies and not stop.is_set():
+                for sequence, (reply_current, reply_mask) in list(replies.items()):
+                    best_column, depth, solved = self.pondered.get(sequence, (None, 0, False))
+                    result = self._deepen(reply_current, reply_mask, moves, best_column, depth, depth + 1)
+                    if result[1] == depth:  # stopped
+                        return
+                    self.pondered[sequence] = result
+                    if result[2] or result[1] >= min(self.max_depth, 42 - moves):
+                        del replies[sequence]
+        finally:
+            self._stop = None
+
+    def _deepen(self, current: int, mask: int, moves: int, best_column: Optional[int], depth: int,
+                max_depth: Optional[int] = None) -> tuple[Optional[int], int, bool]:
+        """
+        Runs searches of the given position one ply deeper each time, starting after the given depth (whose best
+        column is best_column), until the deadline passes, ponder is stopped, the result of the game is known or
+        max_depth (self.max_depth by default) is reached.
+
+        Returns the best column and depth of the deepest completed search, and whether the result of the game is known.
+        """
+        if max_depth is None:
+            max_depth = self.max_depth
+        for next_depth in range(depth + 1, min(max_depth, 42 - moves) + 1):
+            try:
+                score, column = self.search(current, mask, moves, next_depth, best_column)
+            except _SearchTimeout:
+                break
+            best_column, depth = column, next_depth
+            if abs(score) > WIN_SCORE - 43:  # the result of the game is known, searching deeper will not change it
+                return best_column, depth, True
+        return best_column, depth, False
+
+    def search(self, current: int, mask: int, moves: int, depth: int,
+               first_column: Optional[int] = None) -> tuple[int, int]:
+        """
+        Searches the given position to the given depth and returns the best score and column for the player to move.
+
+        If first_column is given, it is searched before the other columns.
+        """
+        order = CENTRE_FIRST_ORDER
+        if first_column is not None:
+            order = [first_column] + [column for column in CENTRE_FIRST_ORDER if column != first_column]
+
+        for column in order:
+            if can_play(mask, column) and is_winning_move(current, mask, column):
+                return WIN_SCORE - moves - 1, column
+
+        alpha, beta = -WIN_SCORE, WIN_SCORE
+        best_column = None
+        for column in order:
+            if can_play(mask, column):
+                score = -self._negamax(current ^ mask, mask | (mask + _BOTTOM_MASKS[column]), moves + 1, depth - 1,
+                                       -beta, -alpha)
+                if best_column is None or score > alpha:
+                    alpha = score
+                    best_column = column
+        return alpha, best_column
+
+    def _negamax(self, current: int, mask: int, moves: int, depth: int, alpha: int, beta: int) -> int:
+        """
+        Returns the score of the given position for the player to move, searched to the given depth.
+
+        The score is exact if it lies strictly between alpha and beta, and is otherwise a bound on the exact score.
+        """
+        self.nodes += 1
+        if self.nodes & 255 == 0 and ((self._deadline is not None and time.perf_counter() > self._deadline) or
+                                      (self._stop is not None and self._stop.is_set())):
+            raise _SearchTimeout
+
+        if moves == 42:
+            return 0
+        for column in CENTRE_FIRST_ORDER:
+            if can_play(mask, column) and is_winning_move(current, mask, column):
+                return WIN_SCORE - moves - 1
+        if moves == 41:  # the only move left fills the board without winning
+            return 0
+        if depth <= 0:
+            return evaluate(current, mask)
+
+        # current + mask is unique to each position, since it has one extra bit above each column's pieces
+        key = current + mask
+        order = CENTRE_FIRST_ORDER
+        original_alpha = alpha
+        entry = self.table.probe(key)
+        if entry is not None:
+            score, entry_depth, kind, move = entry
+            if entry_depth >= depth:
+                if kind == EXACT:
+                    return score
+                elif kind == LOWER_BOUND:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+            if move != NO_MOVE:
+                order = [move] + [column for column in CENTRE_FIRST_ORDER if column != move]
+
+        best_column = NO_MOVE
+        for column in order:
+            if can_play(mask, column):
+                score = -self._negamax(current ^ mask, mask | (mask + _BOTTOM_MASKS[column]), moves + 1, depth - 1,
+                                       -beta, -alpha)
+                if score >= beta:
+                    self.table.store(key, score, depth, LOWER_BOUND, column)
+                    return score
+                if score > alpha:
+                    alpha = score
+                    best_column = column
+
+        if alpha > original_alpha:
+            self.table.store(key, alpha, depth, EXACT, best_column)
+        else:
+            self.table.store(key, alpha, depth, UPPER_BOUND, best_column)
+        return alpha
@@ -0,0 +1,30 @@
+"""
+Tests for MoveTreeCheckpoint.
+"""
+from checkpoint import MoveTreeCheckpoint
+from learning_player import MoveTree, GAME_START_MOVE
+
+
+def _empty_tree() -> MoveTree:
+    return MoveTree(GAME_START_MOVE)
+
+
+def test_torn_journal_tail_is_cut_off(tmp_path) -> None:
+    directory = str(tmp_path)
+    with MoveTreeCheckpoint(directory, _empty_tree) as checkpoint:
+        checkpoint.record_game(['D', 'D'], 'red')
+        checkpoint.record_game(['D', 'C'], 'yellow')
+        journal = checkpoint._journal_filename(checkpoint.generation)
+
+    with open(journal, 'ab') as file:  # a crash after writing the winner, but before the newline after it
+        file.write(b'C,C\nred')
+
+    with MoveTreeCheckpoint(directory, _empty_tree) as checkpoint:
+        assert checkpoint.journal_games == 2
+        assert checkpoint.tree.find_subtree_by_move('C') is None
+        checkpoint.record_game(['E', 'E'], 'draw')
+
+    with MoveTreeCheckpoint(directory, _empty_tree) as checkpoint:
+        assert checkpoint.journal_games == 3
+        assert checkpoint.tree.subtrees['E'].subtrees['E'].win_probability == 0.0
+        assert checkpoint.tree.subtrees['D'].win_probability == 0.0
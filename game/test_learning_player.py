@@ -0,0 +1,70 @@
+"""
+Tests for MoveTree.
+"""
+from learning_player import MoveTree, GAME_START_MOVE
+import random
+
+
+def _random_games(num_games: int, seed: int) -> list[tuple[list[str], float]]:
+    """
+    Returns random (move sequence, win_probability) games of 6 moves, from only a few columns so that they share
+    prefixes. As with real games, no game is the start of another, and each sequence always has the same result.
+    """
+    rng = random.Random(seed)
+    games = {tuple(rng.choice('ABCD') for _ in range(6)): rng.choice([1.0, -1.0, 0.0]) for _ in range(num_games)}
+    return [(list(sequence), win_probability) for sequence, win_probability in games.items()]
+
+
+def _assert_same_values(pruned: MoveTree, full: MoveTree) -> None:
+    """
+    Checks that every move kept in pruned has the same win_probability as in full.
+    """
+    stack = [(pruned, full)]
+    while stack:
+        pruned_tree, full_tree = stack.pop()
+        assert abs(pruned_tree.win_probability - full_tree.win_probability) < 1e-9
+        for move, subtree in pruned_tree.subtrees.items():
+            stack.append((subtree, full_tree.subtrees[move]))
+
+
+def test_prune_then_insert_keeps_collapsed_values() -> None:
+    tree = MoveTree(GAME_START_MOVE)
+    tree.insert_move_sequence(['D', 'A'], 1.0)
+    tree.insert_move_sequence(['D', 'B'], -1.0)
+
+    for _ in range(5):
+        tree.prune(min_visits=100)
+        tree.insert_move_sequence(['D', 'A'], 1.0)
+
+    assert tree.subtrees['D'].is_leaf()
+    assert tree.subtrees['D'].collapsed_moves == {'A': 1.0, 'B': -1.0}
+    assert tree.win_probability == 0.0
+
+
+def test_repeated_prune_and_insert_matches_unpruned_tree() -> None:
+    games = _random_games(500, 1)
+    full = MoveTree(GAME_START_MOVE)
+    pruned = MoveTree(GAME_START_MOVE)
+    for sequence, win_probability in games:
+        full.insert_move_sequence(sequence, win_probability)
+        pruned.insert_move_sequence(sequence, win_probability)
+
+    rng = random.Random(2)
+    for min_visits in (3, 10, 30):
+        assert pruned.prune(min_visits) > 0
+        for sequence, win_probability in rng.sample(games, 200):
+            full.insert_move_sequence(sequence, win_probability)
+            pruned.insert_move_sequence(sequence, win_probability)
+        _assert_same_values(pruned, full)
+
+
+def test_prune_to_size_stays_close_to_max_size() -> None:
+    tree = MoveTree.from_games(_random_games(3000, 3))
+    full_size = tree.size()
+
+    for max_size in (full_size * 3 // 4, full_size // 2, full_size // 10):
+        num_removed = tree.prune_to_size(max_size)
+        size = tree.size()
+        assert size == full_size - num_removed
+        assert max_size - len('ABCD') < size <= max_size
+        full_size = size
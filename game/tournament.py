@@ -0,0 +1,296 @@
+"""
+Plays tournaments between Connect 4 players and estimates their Elo ratings.
+
+Every game of a tournament is scheduled ahead of time with its own seed, and the games can be played by a pool of
+processes, so for a given seed the results are the same however many processes play them. Each pair of players
+alternates colours from one game to the next.
+
+Ratings are the maximum likelihood Bradley-Terry ratings of the results on the Elo scale (400 points for odds of 10 to
+1), with a draw counting as half a win, and a virtual draw between every pair that played so that a perfect score still
+gets a finite rating. The confidence intervals are found by bootstrapping: the games are resampled with replacement and
+the ratings recalculated many times.
+
+Running this module plays a tournament between some standard players, for example:
+    python tournament.py random search mcts --games 20 --workers 4 --output results.json
+"""
+from __future__ import annotations
+from manager import *
+from concurrent.futures import ProcessPoolExecutor, wait
+from typing import Any, Callable
+import instrumentation
+import argparse
+import inspect
+import json
+import math
+import time
+
+# the entrants of the tournament being played, set in each process by _init_worker
+_entrants = []
+
+
+class Entrant:
+    """
+    A player taking part in a tournament.
+
+    Instance Attributes:
+        - name: the name the player's results are reported under
+        - player_type: the Player subclass to play with
+        - kwargs: the keyword arguments the player is created with, apart from its colour (and seed). They are sent
+        to every worker process once, so they must be picklable.
+        - colour_kwargs: extra keyword arguments for playing as 'red' or as 'yellow', for example the tree of a
+        LearningPlayer
+    """
+    name: str
+    player_type: type
+    kwargs: dict[str, Any]
+    colour_kwargs: dict[str, dict[str, Any]]
+
+    def __init__(self, name: str, player_type: type, kwargs: Optional[dict[str, Any]] = None,
+                 colour_kwargs: Optional[dict[str, dict[str, Any]]] = None):
+        self.name = name
+        self.player_type = player_type
+        self.kwargs = kwargs or {}
+        self.colour_kwargs = colour_kwargs or {}
+
+    def create(self, colour: str, seed: str) -> Player:
+        """
+        Returns a new player of the given colour. The seed is passed on if the player's type takes one.
+        """
+        kwargs = dict(self.kwargs, **self.colour_kwargs.get(colour, {}))
+        if 'seed' in inspect.signature(self.player_type).parameters:
+            kwargs.setdefault('seed', seed)
+        return self.player_type(colour=colour, **kwargs)
+
+
+def round_robin(num_entrants: int, games_per_pair: int) -> list[tuple[int, int]]:
+    """
+    Returns the (red, yellow) entrant indices of every game of a round robin, where each pair of entrants plays
+    games_per_pair games, alternating colours.
+    """
+    return [(first, second) if game % 2 == 0 else (second, first)
+            for first in range(num_entrants) for second in range(first + 1, num_entrants)
+            for game in range(games_per_pair)]
+
+
+def gauntlet(num_entrants: int, games_per_pair: int) -> list[tuple[int, int]]:
+    """
+    Returns the (red, yellow) entrant indices of every game of a gauntlet, where the first entrant plays
+    games_per_pair games against each of the others, alternating colours.
+    """
+    return [(0, opponent) if game % 2 == 0 else (opponent, 0)
+            for opponent in range(1, num_entrants) for game in range(games_per_pair)]
+
+
+def _init_worker(entrants: list[Entrant], instrumented: bool = False) -> None:
+    """
+    Stores the entrants of the tournament in a worker process, and enables instrumentation there if it is enabled in
+    the main process.
+    """
+    global _entrants
+    _entrants = entrants
+    if instrumented:
+        instrumentation.enable()
+
+
+def _play_game(red: int, yellow: int, seed: str, board_type: type,
+               collect_stats: bool = False) -> tuple[str, list[str], Optional[instrumentation.Counters]]:
+    """
+    Plays one game between the given entrants, and returns its winner and moves.
+
+    If collect_stats is True (in a worker process with instrumentation enabled), the instrumentation counters of the
+    game are returned too, and reset.
+    """
+    random.seed(seed)
+    red_player = _entrants[red].create('red', seed + '-red')
+    yellow_player = _entrants[yellow].create('yellow', seed + '-yellow')
+    game = GameManager(red_player, yellow_player, board_type,
+                       player_names={'red': _entrants[red].name, 'yellow': _entrants[yellow].name})
+    try:
+        game.run_game()
+    finally:
+        for player in (red_player, yellow_player):
+            if hasattr(player, 'close'):
+                player.close()
+    return game.winner, game.move_sequence, instrumentation.take() if collect_stats else None
+
+
+def run_tournament(entrants: list[Entrant], games_per_pair: int = 10, schedule: str = 'round_robin',
+                   workers: int = 1, seed: int = 0, board_type: type = Board, time_limit: Optional[float] = None,
+                   bootstrap_samples: int = 1000) -> dict[str, Any]:
+    """
+    Plays a tournament and returns its results, which can be saved as JSON.
+
+    schedule is 'round_robin' or 'gauntlet' (the first entrant against each of the others). If time_limit is given, the
+    games that have not started after that many seconds are skipped, and the results cover the games that were played.
+
+    The results hold:
+        - games: the red and yellow entrants, winner, seed and moves of every game played, in schedule order
+        - scores: the wins, losses and draws of every entrant
+        - ratings: the Elo rating of every entrant, relative to an average of 0, with a 95% confidence interval
+        - instrumentation: if instrumentation is enabled, instrumentation.stats() after the tournament (the counters
+        are not reset first)
+    """
+    if schedule == 'round_robin':
+        pairings = round_robin(len(entrants), games_per_pair)
+    elif schedule == 'gauntlet':
+        pairings = gauntlet(len(entrants), games_per_pair)
+    else:
+        raise ValueError(f'unknown schedule {schedule!r}')
+    seeds = [f'{seed}-{game}' for game in range(len(pairings))]
+
+    if workers > 1:
+        instrumented = instrumentation.enabled
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(entrants, instrumented)) as executor:
+            futures = [executor.submit(_play_game, red, yellow, game_seed, board_type, instrumented)
+                       for (red, yellow), game_seed in zip(pairings, seeds)]
+            if time_limit is not None:
+                wait(futures, timeout=time_limit)
+                for future in futures:
+                    future.cancel()  # only cancels the games that have not started
+            outcomes = [None if future.cancelled() else future.result() for future in futures]
+        for outcome in outcomes:
+            if outcome is not None and outcome[2] is not None:
+                instrumentation.counters.merge(outcome[2])
+    else:
+        _init_worker(entrants)
+        deadline = None if time_limit is None else time.perf_counter() + time_limit
+        outcomes = []
+        for (red, yellow), game_seed in zip(pairings, seeds):
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            outcomes.append(_play_game(red, yellow, game_seed, board_type))
+
+    games = [{'red': entrants[red].name, 'yellow': entrants[yellow].name, 'winner': outcome[0], 'seed': game_seed,
+              'moves': ''.join(outcome[1])}
+             for (red, yellow), game_seed, outcome in zip(pairings, seeds, outcomes) if outcome is not None]
+    results = [(red, yellow, outcome[0]) for (red, yellow), outcome in zip(pairings, outcomes) if outcome is not None]
+
+    scores = {entrant.name: {'wins': 0, 'losses': 0, 'draws': 0} for entrant in entrants}
+    for red, yellow, winner in results:
+        if winner == 'draw':
+            scores[entrants[red].name]['draws'] += 1
+            scores[entrants[yellow].name]['draws'] += 1
+        else:
+            winning, losing = (red, yellow) if winner == 'red' else (yellow, red)
+            scores[entrants[winning].name]['wins'] += 1
+            scores[entrants[losing].name]['losses'] += 1
+
+    ratings = estimate_ratings(len(entrants), results)
+    intervals = bootstrap_ratings(len(entrants), results, bootstrap_samples, seed)
+    tournament = {
+        'schedule': schedule,
+        'games_per_pair': games_per_pair,
+        'seed': seed,
+        'games': games,
+        'scores': scores,
+        'ratings': {entrant.name: {'elo': round(ratings[i], 1), 'low': round(intervals[i][0], 1),
+                                   'high': round(intervals[i][1], 1)} for i, entrant in enumerate(entrants)}
+    }
+    if instrumentation.enabled:
+        tournament['instrumentation'] = instrumentation.stats()
+    return tournament
+
+
+def estimate_ratings(num_entrants: int, results: list[tuple[int, int, str]], iterations: int = 1000) -> list[float]:
+    """
+    Returns the maximum likelihood Elo rating of each entrant from the given (red, yellow, winner) results, with the
+    ratings averaging 0.
+
+    Every pair that played gets one extra virtual draw. The ratings are found with the minorization-maximization
+    algorithm for the Bradley-Terry model.
+    """
+    games = [[0.0] * num_entrants for _ in range(num_entrants)]
+    points = [0.0] * num_entrants
+    for red, yellow, winner in results:
+        if games[red][yellow] == 0:  # the virtual draw
+            games[red][yellow] = games[yellow][red] = 1.0
+            points[red] += 0.5
+            points[yellow] += 0.5
+        games[red][yellow] += 1
+        games[yellow][red] += 1
+        points[red] += {'red': 1.0, 'draw': 0.5}.get(winner, 0.0)
+        points[yellow] += {'yellow': 1.0, 'draw': 0.5}.get(winner, 0.0)
+
+    strengths = [1.0] * num_entrants
+    for _ in range(iterations):
+        new_strengths = []
+        for i in range(num_entrants):
+            denominator = sum(games[i][j] / (strengths[i] + strengths[j]) for j in range(num_entrants) if games[i][j])
+            new_strengths.append(points[i] / denominator if denominator else strengths[i])
+        # keep the geometric mean at 1, so the ratings average 0
+        scale = math.exp(sum(math.log(strength) for strength in new_strengths) / num_entrants)
+        new_strengths = [strength / scale for strength in new_strengths]
+        converged = max(abs(math.log(new / old)) for new, old in zip(new_strengths, strengths)) < 1e-9
+        strengths = new_strengths
+        if converged:
+            break
+
+    return [400 * math.log10(strength) for strength in strengths]
+
+
+def bootstrap_ratings(num_entrants: int, results: list[tuple[int, int, str]], samples: int = 1000,
+                      seed: int = 0) -> list[tuple[float, float]]:
+    """
+    Returns a 95% confidence interval for the Elo rating of each entrant, by estimating the ratings of samples sets of
+    games drawn with replacement from the given results.
+    """
+    if not results or samples <= 0:
+        return [(0.0, 0.0)] * num_entrants
+    rng = random.Random(seed)
+    estimates = [estimate_ratings(num_entrants, rng.choices(results, k=len(results)), 200) for _ in range(samples)]
+
+    intervals = []
+    for i in range(num_entrants):
+        ratings = sorted(estimate[i] for estimate in estimates)
+        intervals.append((ratings[int(0.025 * (samples - 1))], ratings[int(0.975 * (samples - 1))]))
+    return intervals
+
+
+def _standard_entrants() -> dict[str, Callable[[], Entrant]]:
+    """
+    Returns the players that can be entered from the command line, by name.
+    """
+    from search_player import SearchPlayer
+    from mcts_player import MCTSPlayer
+
+    def learning_entrant() -> Entrant:
+        from learning_player import LearningPlayer, load_move_tree
+        return Entrant('learning', LearningPlayer, {'exploration_probability': 1.0},
+                       {colour: {'past_games': load_move_tree('data/100k_games_learning.csv', colour)}
+                        for colour in ('red', 'yellow')})
+
+    return {
+        'random': lambda: Entrant('random', RandomPlayer),
+        'learning': learning_entrant,
+        'search': lambda: Entrant('search', SearchPlayer, {'time_budget': 0.05}),
+        'search-depth4': lambda: Entrant('search-depth4', SearchPlayer, {'time_budget': 10.0, 'max_depth': 4}),
+        'mcts': lambda: Entrant('mcts', MCTSPlayer, {'time_budget': 0.05}),
+        'mcts-1000': lambda: Entrant('mcts-1000', MCTSPlayer, {'iterations': 1000}),
+    }
+
+
+if __name__ == '__main__':
+    standard_entrants = _standard_entrants()
+    parser = argparse.ArgumentParser(description='Plays a tournament between standard players.')
+    parser.add_argument('players', nargs='+', choices=sorted(standard_entrants))
+    parser.add_argument('--games', type=int, default=10, help='the number of games each pair of players plays')
+    parser.add_argument('--schedule', choices=['round_robin', 'gauntlet'], default='round_robin')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--time-limit', type=float, help='stop starting new games after this many seconds')
+    parser.add_argument('--output', help='the JSON file to write the results to')
+    parser.add_argument('--instrument', action='store_true', help='includes instrumentation stats in the results')
+    args = parser.parse_args()
+
+    if args.instrument:
+        instrumentation.enable()
+    tournament = run_tournament([standard_entrants[name]() for name in args.players], args.games, args.schedule,
+                                args.workers, args.seed, time_limit=args.time_limit)
+    for name, rating in sorted(tournament['ratings'].items(), key=lambda item: -item[1]['elo']):
+        score = tournament['scores'][name]
+        print(f'{name}: {rating["elo"]:+.0f} ({rating["low"]:+.0f} to {rating["high"]:+.0f}), '
+              f'{score["wins"]}-{score["losses"]}-{score["draws"]}')
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(tournament, file, indent=2)
@@ -0,0 +1,113 @@
+"""
+A fixed-size cache of searched positions, used by SearchPlayer to avoid searching the same position more than once.
+"""
+from __future__ import annotations
+from typing import Optional
+from array import array
+
+# the kinds of score that can be stored
+EXACT = 1
+LOWER_BOUND = 2
+UPPER_BOUND = 3
+NO_MOVE = 7
+
+_BYTES_PER_ENTRY = 16  # an unsigned 64 bit key and an unsigned 64 bit packed entry
+_SCORE_OFFSET = 1 << 15
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_HASH_MASK = (1 << 64) - 1
+
+
+class TranspositionTable:
+    """
+    A transposition table with a fixed number of entries, chosen by its size in megabytes.
+
+    The entries are grouped into buckets of two. The first entry of a bucket is replaced only by a search at least as
+    deep as the one it holds, and the second entry is always replaced, so deep results stay in the table while recent
+    shallow ones can still be found.
+
+    Each entry holds a position key and the position's score, the depth it was searched to, whether the score is exact
+    or a bound (EXACT, LOWER_BOUND or UPPER_BOUND), and the best move found (a column index, or NO_MOVE).
+
+    Instance Attributes:
+        - num_buckets: the number of buckets in the table
+        - hits: the number of probes that found their position
+        - misses: the number of probes that did not find their position
+        - overwrites: the number of stores that replaced a different position
+    """
+    num_buckets: int
+    hits: int
+    misses: int
+    overwrites: int
+    _keys: array
+    _entries: array
+
+    def __init__(self, size_mb: float = 16):
+        self.num_buckets = max(1, int(size_mb * 2 ** 20) // (2 * _BYTES_PER_ENTRY))
+        self._keys = array('Q', bytes(8 * 2 * self.num_buckets))
+        self._entries = array('Q', bytes(8 * 2 * self.num_buckets))
+        self.hits = 0
+        self.misses = 0
+        self.overwrites = 0
+
+    def clear(self) -> None:
+        """
+        Removes every entry from the table and resets its counters.
+        """
+        self._keys = array('Q', bytes(8 * 2 * self.num_buckets))
+        self._entries = array('Q', bytes(8 * 2 * self.num_buckets))
+        self.hits = 0
+        self.misses = 0
+        self.overwrites = 0
+
+    def _bucket(self, key: int) -> int:
+        """
+        Returns the index of the first entry of the bucket that the given key belongs to.
+        """
+        return 2 * ((((key * _HASH_MULTIPLIER) & _HASH_MASK) >> 16) % self.num_buckets)
+
+    def probe(self, key: int) -> Optional[tuple[int, int, int, int]]:
+        """
+        Returns the (score, depth, kind of score, best move) stored for the given position, or None if there is none.
+        """
+        index = self._bucket(key)
+        for slot in (index, index + 1):
+            entry = self._entries[slot]
+            if entry != 0 and self._keys[slot] == key:
+                self.hits += 1
+                return (entry & 0xFFFF) - _SCORE_OFFSET, (entry >> 16) & 0xFF, (entry >> 24) & 0x3, entry >> 26
+        self.misses += 1
+        return None
+
+    def store(self, key: int, score: int, depth: int, kind: int, move: int = NO_MOVE) -> None:
+        """
+        Stores the result of searching the given position.
+
+        Preconditions:
+            - 0 <= key < 2 ** 64
+            - -2 ** 15 <= score < 2 ** 15
+            - 0 <= depth < 256
+            - kind in {EXACT, LOWER_BOUND, UPPER_BOUND}
+            - 0 <= move <= NO_MOVE
+        """
+        entry = (score + _SCORE_OFFSET) | (depth << 16) | (kind << 24) | (move << 26)
+        index = self._bucket(key)
+        keys, entries = self._keys, self._entries
+
+        if entries[index] == 0 or keys[index] == key or depth >= (entries[index] >> 16) & 0xFF:
+            if entries[index] != 0 and keys[index] != key:  # keep the replaced position in the second entry
+                if entries[index + 1] != 0 and keys[index + 1] != key:
+                    self.overwrites += 1
+                keys[index + 1], entries[index + 1] = keys[index], entries[index]
+            elif keys[index + 1] == key:  # do not keep an older result for the same position
+                entries[index + 1] = 0
+            keys[index], entries[index] = key, entry
+        else:
+            if entries[index + 1] != 0 and keys[index + 1] != key:
+                self.overwrites += 1
+            keys[index + 1], entries[index + 1] = key, entry
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the table's hit, miss and overwrite counters.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'overwrites': self.overwrites}
@@ -2,11 +2,13 @@
 Implements the main game loop, title screen, and other UI elements.
 """
 from manager import *
-from learning_player import MoveTree, LearningPlayer, run_learning_algorithm
+from learning_player import MoveTree, LearningPlayer, run_learning_algorithm, load_move_tree
+from checkpoint import MoveTreeCheckpoint
 import pygame
 import pygame_gui
 import sys
-from user import get_user_mouse_position, HumanPlayer
+from user import get_user_mouse_position, HumanPlayer, wait_for
+from async_player import AsyncPlayer, run_in_background
 
 
 def title_screen():
@@ -178,7 +180,8 @@ def ai_game():
     """
     Begins a game between the user and the LearningPlayer AI.
     Trains the LearningPlayer on 100,000 games of Connect 4 before beginning.
-    The LearningPlayer will continue to learn from each game played against the user.
+    The LearningPlayer will continue to learn from each game played against the user, and what it learns is kept in
+    data/ai_checkpoint, so it carries on from where it left off the next time.
     """
     pygame.display.quit()
 
@@ -191,17 +194,15 @@ def ai_game():
     screen.blit(load_message, (100, 0))
     pygame.display.update()
 
-    red_player = LearningPlayer('red', MoveTree('*'), 1.0)
-
-    red_player.insert_games_from_csv('data/100k_games_learning.csv')
-
-    game_tree = red_player.past_games
+    checkpoint = wait_for(run_in_background(MoveTreeCheckpoint, 'data/ai_checkpoint',
+                                            lambda: load_move_tree('data/100k_games_learning.csv')))
+    game_tree = checkpoint.tree
 
     while True:
 
         pygame.display.quit()
 
-        red_player = LearningPlayer('red', game_tree, 1.0)
+        red_player = AsyncPlayer(LearningPlayer('red', game_tree, 1.0))
 
         yellow_player = HumanPlayer('yellow')
 
@@ -221,47 +222,51 @@ def ai_game():
 
         game = GameManager(red_player, yellow_player)
 
-        while not game.board.full_board():
-            if len(game.move_sequence) % 2 == 0:
-                moving_player = 'red'
-                move = red_player.make_move(available_columns, game)
-                game.add_piece('red', move)
-                pygame.draw.circle(screen, (220, 20, 60),
-                                   (100 + (ord(move) - 65) * 125, 75 + (5 - game.moves_per_column[move]) * 125), 50)
-            else:
-                moving_player = 'yellow'
-                while True:
-                    move = yellow_player.make_move(available_columns, game)
-                    if move in available_columns:
-                        break
-                game.add_piece('yellow', move)
-                pygame.draw.circle(screen, (255, 255, 51),
-                                   (100 + (ord(move) - 65) * 125, 75 + (5 - game.moves_per_column[move]) * 125), 50)
-            pygame.display.flip()
-            pygame.time.delay(240 * 2)
-            game.moves_per_column[move] += 1
-            if game.moves_per_column[move] >= 6:
-                available_columns.remove(move)
-            if game.board.check_win((move, game.moves_per_column[move])):
-                game.winner = moving_player
-                font = pygame.font.SysFont('bahnschrift', 100)
-                win_message = font.render(f'{moving_player.upper()} wins!', True, (0, 0, 0), (255, 255, 255))
-                if moving_player == 'red':
-                    screen.blit(win_message, (275, 0))
-                    game_tree.insert_move_sequence(game.move_sequence, 1.0)
+        try:
+            while not game.board.full_board():
+                if len(game.move_sequence) % 2 == 0:
+                    moving_player = 'red'
+                    move = wait_for(red_player.request_move(available_columns, game))
+                    game.add_piece('red', move)
+                    pygame.draw.circle(screen, (220, 20, 60),
+                                       (100 + (ord(move) - 65) * 125, 75 + (5 - game.moves_per_column[move]) * 125), 50)
                 else:
-                    screen.blit(win_message, (150, 0))
-                    game_tree.insert_move_sequence(game.move_sequence, -1.0)
+                    moving_player = 'yellow'
+                    red_player.start_pondering(game)
+                    while True:
+                        move = yellow_player.make_move(available_columns, game)
+                        if move in available_columns:
+                            break
+                    game.add_piece('yellow', move)
+                    pygame.draw.circle(screen, (255, 255, 51),
+                                       (100 + (ord(move) - 65) * 125, 75 + (5 - game.moves_per_column[move]) * 125), 50)
                 pygame.display.flip()
+                pygame.time.delay(240 * 2)
+                game.moves_per_column[move] += 1
+                if game.moves_per_column[move] >= 6:
+                    available_columns.remove(move)
+                if game.board.check_win((move, game.moves_per_column[move])):
+                    game.winner = moving_player
+                    font = pygame.font.SysFont('bahnschrift', 100)
+                    win_message = font.render(f'{moving_player.upper()} wins!', True, (0, 0, 0), (255, 255, 255))
+                    if moving_player == 'red':
+                        screen.blit(win_message, (275, 0))
+                        checkpoint.record_game(game.move_sequence, 'red')
+                    else:
+                        screen.blit(win_message, (150, 0))
+                        checkpoint.record_game(game.move_sequence, 'yellow')
+                    pygame.display.flip()
+                    pygame.time.delay(2000)
+                    break
+            if game.board.full_board():
+                font = pygame.font.SysFont('bahnschrift', 100)
+                draw_message = font.render(f'DRAW', True, (0, 0, 0), (255, 255, 255))
+                screen.blit(draw_message, (375, 0))
+                pygame.display.flip()
+                checkpoint.record_game(game.move_sequence, 'draw')
                 pygame.time.delay(2000)
-                break
-        if game.board.full_board():
-            font = pygame.font.SysFont('bahnschrift', 100)
-            draw_message = font.render(f'DRAW', True, (0, 0, 0), (255, 255, 255))
-            screen.blit(draw_message, (375, 0))
-            pygame.display.flip()
-            game_tree.insert_move_sequence(game.move_sequence, 0.0)
-            pygame.time.delay(2000)
+        finally:
+            red_player.cancel()  # stops any pondering when the game ends or the window is closed
 
 
 title_screen()
@@ -2,11 +2,22 @@
 Allows the user to play Connect 4 against the computer.
 """
 from manager import *
-from learning_player import MoveTree, LearningPlayer, run_learning_algorithm
+from learning_player import MoveTree, LearningPlayer, run_learning_algorithm, load_move_tree
+from async_player import AsyncPlayer
+from concurrent.futures import Future
 import pygame
 import sys
 
 
+def quit_game():
+    """
+    Closes the pygame window and exits.
+    """
+    print('Exiting Pygame window. Please restart the Python console!')
+    pygame.display.quit()
+    sys.exit(0)
+
+
 def get_user_mouse_position() -> tuple[int, int]:
     """
     Returns the position of the mouse when the screen is clicked by user.
@@ -19,9 +30,22 @@ def get_user_mouse_position() -> tuple[int, int]:
     if event.type == pygame.MOUSEBUTTONUP:
         return event.pos
     elif event.type == pygame.QUIT:
-        print('Exiting Pygame window. Please restart the Python console!')
-        pygame.display.quit()
-        sys.exit(0)
+        quit_game()
+
+
+def wait_for(future: Future):
+    """
+    Keeps the pygame window responding, at up to 60 frames per second, until the given future is done, and returns its
+    result. Exits if the window is closed in the meantime, abandoning the future.
+    """
+    clock = pygame.time.Clock()
+    while not future.done():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                future.cancel()
+                quit_game()
+        clock.tick(60)
+    return future.result()
 
 
 class HumanPlayer(Player):
@@ -57,9 +81,7 @@ def run_interactive_game():
     """
     # first, train the AI for a while
 
-    red_player = LearningPlayer('red', MoveTree('*'), 1.0)
-
-    red_player.insert_games_from_csv('data/50k_games_learning.csv')
+    red_player = AsyncPlayer(LearningPlayer('red', load_move_tree('data/50k_games_learning.csv'), 1.0))
 
     yellow_player = HumanPlayer('yellow')
 
@@ -77,31 +99,35 @@ def run_interactive_game():
 
     game = GameManager(red_player, yellow_player)
 
-    while not game.board.full_board():
-        if len(game.move_sequence) % 2 == 0:
-            moving_player = 'red'
-            move = red_player.make_move(available_columns, game)
-            game.add_piece('red', move)
-            pygame.draw.circle(screen, (220, 20, 60),
-                               (100 + (ord(move) - 65) * 125, 75 + (5 - game.moves_per_column[move]) * 125), 50)
-        else:
-            moving_player = 'yellow'
-            while True:
-                move = yellow_player.make_move(available_columns, game)
-                if move in available_columns:
-                    break
-            game.add_piece('yellow', move)
-            pygame.draw.circle(screen, (255, 255, 51),
-                               (100 + (ord(move) - 65) * 125, 75 + (5 - game.moves_per_column[move]) * 125), 50)
-        pygame.display.flip()
-        pygame.time.delay(240 * 2)
-        game.moves_per_column[move] += 1
-        if game.moves_per_column[move] >= 6:
-            available_columns.remove(move)
-        if game.board.check_win((move, game.moves_per_column[move])):
-            winner = moving_player
-            print(f'{moving_player.upper()} wins!')
-            break
+    try:
+        while not game.board.full_board():
+            if len(game.move_sequence) % 2 == 0:
+                moving_player = 'red'
+                move = wait_for(red_player.request_move(available_columns, game))
+                game.add_piece('red', move)
+                pygame.draw.circle(screen, (220, 20, 60),
+                                   (100 + (ord(move) - 65) * 125, 75 + (5 - game.moves_per_column[move]) * 125), 50)
+            else:
+                moving_player = 'yellow'
+                red_player.start_pondering(game)
+                while True:
+                    move = yellow_player.make_move(available_columns, game)
+                    if move in available_columns:
+                        break
+                game.add_piece('yellow', move)
+                pygame.draw.circle(screen, (255, 255, 51),
+                                   (100 + (ord(move) - 65) * 125, 75 + (5 - game.moves_per_column[move]) * 125), 50)
+            pygame.display.flip()
+            pygame.time.delay(240 * 2)
+            game.moves_per_column[move] += 1
+            if game.moves_per_column[move] >= 6:
+                available_columns.remove(move)
+            if game.board.check_win((move, game.moves_per_column[move])):
+                winner = moving_player
+                print(f'{moving_player.upper()} wins!')
+                break
+    finally:
+        red_player.cancel()  # stops any pondering when the game ends or the window is closed
 
     pygame.event.clear()
     pygame.event.set_blocked(None)